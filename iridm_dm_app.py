@@ -1,16 +1,36 @@
-"""IRIDM Disaster Management Streamlit Application\n=================================================\nThis Streamlit application is a proof‑of‑concept Disaster‑Management (DM) assistant\nfor **Indian Railways Institute of Disaster Management (IRIDM), Bengaluru**.\nIt focuses on Fire emergencies but is architected so that Natural / Man‑made\ndisasters and additional emergency types can be plugged‑in later.\n\n🚀 **Quick start**\n------------------\n1. ```bash\n   # in a clean venv\n   pip install streamlit geopy pandas pydeck==0.8.0 pillow\n   streamlit run iridm_dm_app.py\n   ```\n2. Place the campus site‑layout image in the same folder and name it\n   `iridm_site_layout.png` (or change `SITE_LAYOUT_PATH`).\n3. Optional: drop a CSV named `fire_stations.csv` with columns\n   `name,latitude,longitude,phone` to override the built‑in sample list.\n\nNOTE: Coordinates used here are **illustrative**. Please replace them with\naccurate GPS data for IRIDM campus features and nearby fire stations.\n"""
+"""IRIDM Disaster Management Streamlit Application\n=================================================\nThis Streamlit application is a proof‑of‑concept Disaster‑Management (DM) assistant\nfor **Indian Railways Institute of Disaster Management (IRIDM), Bengaluru**.\nIt focuses on Fire emergencies but is architected so that Natural / Man‑made\ndisasters and additional emergency types can be plugged‑in later.\n\n🚀 **Quick start**\n------------------\n1. ```bash\n   # in a clean venv\n   pip install streamlit geopy pandas pydeck==0.8.0 pillow\n   streamlit run iridm_dm_app.py\n   ```\n2. Place the campus site‑layout image in the same folder and name it\n   `iridm_site_layout.png` (or change `SITE_LAYOUT_PATH`).\n3. Optional: drop a CSV named `fire_stations.csv` with columns\n   `name,latitude,longitude,phone` to override the built‑in sample list.\n4. Optional offline base map: `basemap.mbtiles` (raster or vector MBTiles)\n   next to the app, plus `basemap.style.json` (a MapLibre style whose sources\n   may use `"url": "mbtiles://basemap"`) for vector tiles. A built‑in server\n   publishes them; `IRIDM_TILE_HOST` / `IRIDM_TILE_PORT` set where it listens\n   (default: Streamlit's interface, port 8765) and `IRIDM_TILE_URL` its public\n   base URL when browsers reach it through a proxy or over HTTPS.\n5. Optional: `road_network.osm` (OSM XML extract) for road‑network truck ETAs\n   and routes.\n6. `IRIDM_LOG_FSYNC` = `always` (default) / `interval` / `never` sets how\n   often incident‑log appends are fsynced.\n\nNOTE: Coordinates used here are **illustrative**. Please replace them with\naccurate GPS data for IRIDM campus features and nearby fire stations.\n"""
 
 from __future__ import annotations
 
+import bisect
+import copy
+import csv
+import hashlib
+import heapq
+import io
+import ipaddress
 import json
-from datetime import datetime
+import multiprocessing
+import os
+import sqlite3
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 from typing import List
+from urllib.parse import urlsplit
 
+import numpy as np
 import pandas as pd
 import streamlit as st
 from geopy.distance import geodesic
 import pydeck as pdk
+from PIL import Image
 
 ###############################################################################
 # -----------------------  CONFIG & CONSTANTS  ------------------------------ #
@@ -21,6 +41,13 @@ IRIDM_LAT, IRIDM_LON = 12.9076, 77.4329  # Kanminike, Mysuru Road, Bengaluru
 
 # Relative path to the schematic layout image shipped with the app
 SITE_LAYOUT_PATH = Path(__file__).with_name("iridm_site_layout.png.png")
+# Where the image's edges fall on the map (west, south, east, north) – illustrative
+SITE_LAYOUT_BOUNDS = (77.4315, 12.9068, 77.4345, 12.9088)
+# Downscaled WebP copies of the layout; the map fetches the one that fits the zoom
+SITE_LAYOUT_VARIANT_DIR = SITE_LAYOUT_PATH.with_name(".layout_variants")
+SITE_LAYOUT_WIDTHS = (256, 512, 1024, 2048)
+SITE_LAYOUT_WEBP_QUALITY = 80
+SITE_LAYOUT_OPACITY = 0.7
 
 # Default fire‑station sample list (replace with authoritative data)
 DEFAULT_FIRE_STATIONS = [
@@ -53,6 +80,14 @@ CAMPUS_LOCATIONS = [
             (12.90795, 77.43305),
             (12.90805, 77.43285),
         ],
+        "exits": ["admin_north_exit", "admin_south_exit"],  # CAMPUS_PATH_NODES ids
+        "occupancy": 80,  # default planning headcount
+        "footprint": [  # building outline (lat, lon), illustrative
+            (12.90770, 77.43300),
+            (12.90805, 77.43300),
+            (12.90805, 77.43340),
+            (12.90770, 77.43340),
+        ],
     },
     {
         "name": "Hostel",
@@ -65,137 +100,3070 @@ CAMPUS_LOCATIONS = [
         "extinguishers": [
             (12.90745, 77.43255),
         ],
+        "exits": ["hostel_exit"],
+        "occupancy": 300,
+        "footprint": [
+            (12.90725, 77.43245),
+            (12.90752, 77.43245),
+            (12.90752, 77.43280),
+            (12.90725, 77.43280),
+        ],
     },
 ]
 
+# Campus walkway graph used for evacuation routing (illustrative coordinates)
+CAMPUS_PATH_NODES = {  # node id -> (lat, lon)
+    "admin_north_exit": (12.9080, 77.4330),
+    "admin_south_exit": (12.9077, 77.4331),
+    "hostel_exit": (12.9075, 77.4325),
+    "north_walk": (12.9082, 77.4324),
+    "central_walk": (12.9077, 77.4326),
+    "main_gate_assembly": (12.9076, 77.4321),
+    "sports_ground_assembly": (12.9078, 77.4320),
+}
+CAMPUS_PATH_EDGES = [  # walkable, two‑way segments
+    ("admin_north_exit", "north_walk"),
+    ("admin_north_exit", "admin_south_exit"),
+    ("north_walk", "main_gate_assembly"),
+    ("north_walk", "sports_ground_assembly"),
+    ("admin_south_exit", "central_walk"),
+    ("central_walk", "hostel_exit"),
+    ("central_walk", "main_gate_assembly"),
+    ("hostel_exit", "sports_ground_assembly"),
+]
+CAMPUS_ASSEMBLY_POINTS = {  # node id -> display name
+    "main_gate_assembly": "Main Gate assembly point",
+    "sports_ground_assembly": "Sports Ground assembly point",
+}
+WALKING_SPEED_MPS = 1.2  # brisk evacuation walking pace
+CAMPUS_GROUND_ALT_M = 830  # approx. ground elevation for GPS‑altitude floor estimates
+FLOOR_HEIGHT_M = 3.5
+EXTINGUISHER_RESULTS = 3  # nearest extinguishers listed for an incident
+# Throughput (persons / minute) for the capacity analysis
+CORRIDOR_DEFAULT_CAPACITY_PPM = 60
+CORRIDOR_CAPACITY_PPM = {  # overrides keyed by sorted (node, node) pairs
+    ("central_walk", "hostel_exit"): 90,
+    ("hostel_exit", "sports_ground_assembly"): 90,
+    ("admin_north_exit", "admin_south_exit"): 30,
+}
+EXIT_CAPACITY_PPM = 45  # per building exit door
+EVAC_TIME_STEP_S = 10  # resolution of the time‑expanded flow network
+EVAC_MAX_HORIZON_S = 3600
+# Agent‑based drill simulator parameters
+DRILL_TIME_STEP_S = 1.0
+DRILL_SPEED_SD_MPS = 0.25
+DRILL_PREMOVEMENT_MEDIAN_S = 45  # alarm → start moving (log‑normal)
+DRILL_PREMOVEMENT_SIGMA = 0.6
+DRILL_SPECIFIC_FLOW_PPSM = 1.3  # persons / s / m of width at optimal density
+DRILL_JAM_DENSITY_PPM2 = 5.4
+DRILL_MIN_SPEED_FRACTION = 0.1
+
+# Floors and rooms per building (building → floor → room), matched by building name
+CAMPUS_HIERARCHY_PATH = Path(__file__).with_name("campus_locations.json")
+STAIR_DESCENT_MPS = 0.4  # vertical descent rate on stairs during an evacuation
+PLACE_SEARCH_MIN_SCORE = 0.3  # trigram similarity below which a search hit is dropped
+PLACE_SEARCH_RESULTS = 10
+
+MAP_COORD_DECIMALS = 5  # ≈ 1 m; coordinates sent to the map are rounded to this
+MAP_MIN_ZOOM, MAP_MAX_ZOOM, MAP_DEFAULT_ZOOM = 4, 20, 16
+MAP_TILE_PX = 512  # deck.gl world size in pixels at zoom 0
+MAP_VIEWPORT_PX = (1200, 800)  # assumed map size; the app cannot read the real one
+MAP_VIEW_MARGIN = 4.0  # ship points for this multiple of the viewport so pans stay filled
+MAP_FULL_LEVEL_POINTS = 5000  # cluster levels up to this size ship whole, not cut to the view
+CLUSTER_RADIUS_PX = 40  # points closer than this on screen merge into one cluster
+CLUSTER_MAX_ZOOM = 16  # above this every point is drawn on its own
+CLUSTER_BUBBLE_PX = 10  # base radius of a cluster bubble; grows with √count
+
+# Offline base map: tiles from a local MBTiles file, served over HTTP on this host.
+# An optional MapLibre style next to it may point a source at "mbtiles://basemap".
+MBTILES_PATH = Path(__file__).with_name("basemap.mbtiles")
+MBTILES_STYLE = MBTILES_PATH.with_suffix(".style.json")
+TILE_SERVER_HOST = os.environ.get("IRIDM_TILE_HOST")  # default: wherever Streamlit listens
+TILE_SERVER_PORT = int(os.environ.get("IRIDM_TILE_PORT", "8765"))
+TILE_SERVER_URL = os.environ.get("IRIDM_TILE_URL")  # public base URL, e.g. behind an HTTPS proxy
+TILE_CACHE_SIZE = 4096  # tiles kept in memory
+TILE_MAX_AGE_S = 7 * 24 * 3600
+
+# Offline gazetteer of villages, landmarks and railway stations around the campus
+GAZETTEER_CSV = Path(__file__).with_name("gazetteer.csv")
+GAZETTEER_RESULTS = 8
+
 AVG_FIRE_TRUCK_SPEED_KMPH = 40  # crude assumption for ETA calculations
 
-# File that persists incident logs between sessions
+# Persisted campus POI × station ETA table, rebuilt when its inputs change
+ETA_MATRIX_CACHE = Path(__file__).with_name("eta_matrix.npz")
+
+# Optional offline road network (OSM XML extract) for realistic fire‑truck ETAs
+ROAD_GRAPH_PATH = Path(__file__).with_name("road_network.osm")
+# Assumed fire‑truck speed per OSM ``highway`` class; other classes are ignored
+ROAD_SPEED_KMPH = {
+    "motorway": 60,
+    "motorway_link": 40,
+    "trunk": 50,
+    "trunk_link": 35,
+    "primary": 40,
+    "primary_link": 30,
+    "secondary": 35,
+    "secondary_link": 25,
+    "tertiary": 30,
+    "tertiary_link": 25,
+    "unclassified": 25,
+    "residential": 20,
+    "living_street": 10,
+    "service": 15,
+}
+ROAD_DEFAULT_SPEED_KMPH = 15  # off‑network legs to/from the nearest road node
+ROAD_ROUTE_CACHE_SIZE = 1024  # station → incident routes kept in memory
+
+EARTH_RADIUS_KM = 6371.0088  # IUGG mean Earth radius
+# Nearest‑neighbour shortlist size that is re-ranked with the exact geodesic distance
+GEODESIC_REFINE_TOP_K = 5
+BACKUP_STATION_COUNT = 2  # ranked fallbacks shown under the primary station
+MUTUAL_AID_RADIUS_KM = 15  # stations listed for mutual aid on a large fire
+# Nearest‑station lookup raster: cell size is grown to stay under the cell budget
+STATION_GRID_CELL_DEG = 0.01  # ≈ 1.1 km
+STATION_GRID_MARGIN_DEG = 0.5  # coverage beyond the outermost stations
+STATION_GRID_MAX_CELLS = 500_000
+
+# Optional authoritative station list and its columnar parse cache
+FIRE_STATIONS_CSV = Path("fire_stations.csv")
+FIRE_STATIONS_CACHE = FIRE_STATIONS_CSV.with_suffix(".npz")
+STATION_COLUMNS = ["name", "latitude", "longitude", "phone"]
+
+# Incident store shared by all sessions/processes, plus a plain‑text CSV mirror
+INCIDENT_DB = Path(__file__).with_name("incident_log.db")
+INCIDENT_FEED_SIZE = 5  # latest events shown above the incident log
+INCIDENT_PAGE_SIZES = [25, 50, 100]
 LOG_FILE = Path(__file__).with_name("incident_log.csv")
+LOG_COLUMNS = ["timestamp", "status", "location", "notes"]
+# fsync policy for log appends: "always" (every row), "interval" (at most once
+# per LOG_FSYNC_INTERVAL_S) or "never" (leave flushing to the OS)
+LOG_FSYNC_POLICY = os.environ.get("IRIDM_LOG_FSYNC", "always")
+LOG_FSYNC_INTERVAL_S = 5.0
 
 ###############################################################################
 # -------------------  INITIALISATION & HELPERS  ---------------------------- #
 ###############################################################################
 
+# Distance backends. All take latitude/longitude in degrees (scalars or
+# broadcastable arrays) and return kilometres; pick per call site by the scale
+# and accuracy it needs. Error bounds are against the WGS‑84 geodesic around
+# the campus; tests/test_distance_backends.py enforces them and
+# ``python iridm_dm_app.py --check-distances`` prints the measured errors.
+#
+#   equirectangular  local flat earth on the WGS‑84 ellipsoid (meridional and
+#                    prime‑vertical radii at the mid‑latitude): < 0.1 m up to
+#                    30 km, < 15 m up to 300 km; wrong across the antimeridian
+#                    and near the poles. The only fast path within metres.
+#   haversine        great circle on the mean‑radius sphere: any range, but
+#                    the sphere itself costs up to 0.53 % of the distance
+#                    (10 m over 2 km, 150 m over 30 km). Fine for ranking.
+#   geodesic         Karney's exact ellipsoidal solution via geopy: reference
+#                    accuracy, pure Python, one pair at a time.
+WGS84_A_KM = 6378.137
+WGS84_E2 = 6.69437999014e-3
+EQUIRECTANGULAR_MAX_ERR_M = {2.0: 0.1, 30.0: 0.1, 300.0: 15.0}  # by max pair distance (km)
+HAVERSINE_MAX_REL_ERR = 0.0053
+
+
+def equirectangular_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    phi = np.radians((np.asarray(lat1, dtype=float) + np.asarray(lat2, dtype=float)) / 2)
+    w2 = 1 - WGS84_E2 * np.sin(phi) ** 2
+    prime_vertical = WGS84_A_KM / np.sqrt(w2)
+    meridional = WGS84_A_KM * (1 - WGS84_E2) / w2 ** 1.5
+    dy = meridional * np.radians(np.subtract(lat2, lat1, dtype=float))
+    dx = prime_vertical * np.cos(phi) * np.radians(np.subtract(lon2, lon1, dtype=float))
+    return np.hypot(dx, dy)
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def geodesic_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    pairs = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (lat1, lon1, lat2, lon2)))
+    flat = [
+        geodesic((a, b), (c, d)).kilometers
+        for a, b, c, d in zip(*(v.ravel() for v in pairs))
+    ]
+    return np.asarray(flat).reshape(pairs[0].shape)
+
+
+DISTANCE_BACKENDS = {
+    "equirectangular": equirectangular_km,
+    "haversine": haversine_km,
+    "geodesic": geodesic_km,
+}
+
+
+def distance_km(lat1, lon1, lat2, lon2, backend: str = "haversine") -> np.ndarray:
+    """Distance in km with the named backend (see ``DISTANCE_BACKENDS``)."""
+    return DISTANCE_BACKENDS[backend](lat1, lon1, lat2, lon2)
+
+
+def _random_pairs(n: int, max_km: float, rng: np.random.Generator) -> tuple[np.ndarray, ...]:
+    """``n`` point pairs around the campus, up to ``max_km`` apart."""
+    bearing = rng.uniform(0, 2 * np.pi, n)
+    km = rng.uniform(0, max_km, n)
+    lat1 = IRIDM_LAT + rng.uniform(-0.5, 0.5, n)
+    lon1 = IRIDM_LON + rng.uniform(-0.5, 0.5, n)
+    lat2 = lat1 + np.degrees(km * np.cos(bearing) / EARTH_RADIUS_KM)
+    lon2 = lon1 + np.degrees(km * np.sin(bearing) / (EARTH_RADIUS_KM * np.cos(np.radians(lat1))))
+    return lat1, lon1, lat2, lon2
+
+
+DISTANCE_CHECK_SCALES = {"campus": 2.0, "city": 30.0, "region": 300.0}  # max pair distance (km)
+
+
+def check_distance_backends(n: int = 2000, seed: int = 0) -> pd.DataFrame:
+    """Errors of the fast backends against geodesic at each ``DISTANCE_CHECK_SCALES`` scale.
+
+    Reports max/mean absolute error in metres and max relative error per
+    backend and scale, next to the documented bound.
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+    for scale, max_km in DISTANCE_CHECK_SCALES.items():
+        pairs = _random_pairs(n, max_km, rng)
+        exact = geodesic_km(*pairs)
+        for backend, bound in (
+            ("equirectangular", f"{EQUIRECTANGULAR_MAX_ERR_M[max_km]:g} m"),
+            ("haversine", f"{HAVERSINE_MAX_REL_ERR:.2%}"),
+        ):
+            err_km = np.abs(distance_km(*pairs, backend=backend) - exact)
+            rows.append({
+                "scale": f"{scale} (≤ {max_km:g} km)",
+                "backend": backend,
+                "max_err_m": round(float(err_km.max() * 1000), 3),
+                "mean_err_m": round(float(err_km.mean() * 1000), 3),
+                "max_rel_err": f"{float((err_km / np.maximum(exact, 1e-9)).max()):.3%}",
+                "bound": bound,
+            })
+    return pd.DataFrame(rows)
+
+
+def benchmark_distance_backends(n: int = 100_000, geodesic_n: int = 2000, seed: int = 0) -> pd.DataFrame:
+    """Throughput of each backend in pairs per second (geodesic on a smaller sample)."""
+    pairs = _random_pairs(n, 30.0, np.random.default_rng(seed))
+    rows = []
+    for backend in DISTANCE_BACKENDS:
+        m = geodesic_n if backend == "geodesic" else n
+        sample = tuple(v[:m] for v in pairs)
+        start = time.perf_counter()
+        distance_km(*sample, backend=backend)
+        elapsed = time.perf_counter() - start
+        rows.append({"backend": backend, "pairs": m, "seconds": round(elapsed, 4), "pairs_per_s": int(m / elapsed)})
+    return pd.DataFrame(rows)
+
+
+def station_distance_matrix_km(
+    lats, lons, stations_df: pd.DataFrame, backend: str = "haversine"
+) -> np.ndarray:
+    """Distances (km) from query points to every station with the named backend.
+
+    Returns an array of shape ``(n_points, n_stations)``.
+    """
+    return distance_km(
+        np.atleast_1d(np.asarray(lats, dtype=float))[:, None],
+        np.atleast_1d(np.asarray(lons, dtype=float))[:, None],
+        stations_df["latitude"].to_numpy(dtype=float)[None, :],
+        stations_df["longitude"].to_numpy(dtype=float)[None, :],
+        backend=backend,
+    )
+
+
+def unit_vectors(lats, lons) -> np.ndarray:
+    """Convert lat/lon degrees to 3‑D unit vectors, shape ``(n, 3)``."""
+    lat = np.radians(np.atleast_1d(np.asarray(lats, dtype=float)))
+    lon = np.radians(np.atleast_1d(np.asarray(lons, dtype=float)))
+    return np.column_stack(
+        (np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat))
+    )
+
+
+class SphericalKDTree:
+    """k‑d tree over points on the unit sphere.
+
+    Chord length is monotone in great‑circle distance, so ordinary Euclidean
+    pruning in 3‑D yields exact great‑circle neighbours.
+    """
+
+    LEAF_SIZE = 32
+
+    def __init__(self, lats, lons):
+        self.xyz = unit_vectors(lats, lons)
+        self.order = np.arange(len(self.xyz))
+        self._start: List[int] = []
+        self._end: List[int] = []
+        self._left: List[int] = []
+        self._right: List[int] = []
+        lo: List[np.ndarray] = []
+        hi: List[np.ndarray] = []
+
+        stack = [(0, len(self.xyz), -1, False)] if len(self.xyz) else []
+        while stack:
+            start, end, parent, is_right = stack.pop()
+            node = len(self._start)
+            if parent >= 0:
+                (self._right if is_right else self._left)[parent] = node
+            pts = self.xyz[self.order[start:end]]
+            lo.append(pts.min(axis=0))
+            hi.append(pts.max(axis=0))
+            self._start.append(start)
+            self._end.append(end)
+            self._left.append(-1)
+            self._right.append(-1)
+            if end - start > self.LEAF_SIZE:
+                dim = int(np.argmax(hi[-1] - lo[-1]))
+                mid = (start + end) // 2
+                part = np.argpartition(pts[:, dim], mid - start)
+                self.order[start:end] = self.order[start:end][part]
+                stack.append((mid, end, node, True))
+                stack.append((start, mid, node, False))
+        self._lo = np.array(lo).reshape(-1, 3)
+        self._hi = np.array(hi).reshape(-1, 3)
+
+    def __len__(self) -> int:
+        return len(self.xyz)
+
+    @staticmethod
+    def chord_to_km(chord) -> np.ndarray:
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0.0, 1.0))
+
+    @staticmethod
+    def km_to_chord(km: float) -> float:
+        return 2 * np.sin(min(km / EARTH_RADIUS_KM, np.pi) / 2)
+
+    def _box_chord(self, node: int, q: np.ndarray) -> float:
+        gap = np.maximum(0.0, np.maximum(self._lo[node] - q, q - self._hi[node]))
+        return float(np.sqrt(gap @ gap))
+
+    def query(self, lat: float, lon: float, k: int = 1):
+        """Return ``(indices, distances_km)`` of the ``k`` nearest points, nearest first."""
+        k = min(k, len(self))
+        if k <= 0:
+            return np.empty(0, dtype=int), np.empty(0)
+        q = unit_vectors(lat, lon)[0]
+        best_i = np.empty(0, dtype=int)
+        best_d = np.empty(0)
+        frontier = [(0.0, 0)]
+        while frontier:
+            box_d, node = heapq.heappop(frontier)
+            if len(best_d) == k and box_d > best_d.max():
+                break
+            if self._left[node] < 0:
+                idx = self.order[self._start[node]:self._end[node]]
+                chord = np.linalg.norm(self.xyz[idx] - q, axis=1)
+                best_i = np.concatenate((best_i, idx))
+                best_d = np.concatenate((best_d, chord))
+                if len(best_d) > k:
+                    keep = np.argpartition(best_d, k - 1)[:k]
+                    best_i, best_d = best_i[keep], best_d[keep]
+            else:
+                for child in (self._left[node], self._right[node]):
+                    heapq.heappush(frontier, (self._box_chord(child, q), child))
+        ranked = np.argsort(best_d)
+        return best_i[ranked], self.chord_to_km(best_d[ranked])
+
+    def query_radius(self, lat: float, lon: float, radius_km: float):
+        """Return ``(indices, distances_km)`` of all points within ``radius_km``, nearest first."""
+        if not len(self):
+            return np.empty(0, dtype=int), np.empty(0)
+        q = unit_vectors(lat, lon)[0]
+        limit = self.km_to_chord(radius_km)
+        hits_i: List[np.ndarray] = []
+        hits_d: List[np.ndarray] = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if self._box_chord(node, q) > limit:
+                continue
+            if self._left[node] < 0:
+                idx = self.order[self._start[node]:self._end[node]]
+                chord = np.linalg.norm(self.xyz[idx] - q, axis=1)
+                mask = chord <= limit
+                hits_i.append(idx[mask])
+                hits_d.append(chord[mask])
+            else:
+                stack.extend((self._left[node], self._right[node]))
+        idx = np.concatenate(hits_i) if hits_i else np.empty(0, dtype=int)
+        chord = np.concatenate(hits_d) if hits_d else np.empty(0)
+        ranked = np.argsort(chord)
+        return idx[ranked], self.chord_to_km(chord[ranked])
+
+
+@st.cache_resource(show_spinner=False)
+def build_station_index(stations_df: pd.DataFrame) -> SphericalKDTree:
+    """Spatial index for an ad‑hoc station frame (the registry carries its own)."""
+    return SphericalKDTree(stations_df["latitude"], stations_df["longitude"])
+
+
+class StationRegistry:
+    """Validated station table plus its spatial index, shared by all sessions."""
+
+    def __init__(self, df: pd.DataFrame, source_sha1: str | None = None, dropped_rows: int = 0):
+        self.df = df
+        self.source_sha1 = source_sha1
+        self.dropped_rows = dropped_rows
+        self.index = SphericalKDTree(df["latitude"], df["longitude"])
+        # Content version used to key caches derived from the station table
+        self.version = source_sha1 or hashlib.sha1(
+            pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()
+        ).hexdigest()
+
+
+def _file_sha1(path: Path) -> str:
+    digest = hashlib.sha1()
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def normalise_station_df(raw: pd.DataFrame) -> tuple[pd.DataFrame, int]:
+    """Validate station columns and coerce dtypes; returns ``(df, dropped_rows)``."""
+    missing = set(STATION_COLUMNS) - set(raw.columns)
+    if missing:
+        raise ValueError(f"{FIRE_STATIONS_CSV} is missing columns: {sorted(missing)}")
+    df = raw[STATION_COLUMNS].copy()
+    df["name"] = df["name"].fillna("").astype(str).str.strip()
+    df["phone"] = df["phone"].fillna("").astype(str).str.strip()
+    df["latitude"] = pd.to_numeric(df["latitude"], errors="coerce")
+    df["longitude"] = pd.to_numeric(df["longitude"], errors="coerce")
+    valid = (
+        (df["name"] != "")
+        & df["latitude"].between(-90, 90)
+        & df["longitude"].between(-180, 180)
+    )
+    return df[valid].reset_index(drop=True), int((~valid).sum())
+
+
+def _read_station_cache(sha1: str) -> tuple[pd.DataFrame, int] | None:
+    if not FIRE_STATIONS_CACHE.exists():
+        return None
+    try:
+        with np.load(FIRE_STATIONS_CACHE, allow_pickle=False) as cache:
+            if str(cache["source_sha1"]) != sha1:
+                return None
+            df = pd.DataFrame({col: cache[col] for col in STATION_COLUMNS})
+            return df, int(cache["dropped_rows"])
+    except (OSError, KeyError, ValueError):
+        return None  # corrupt or outdated cache – fall back to the CSV
+
+
+def _write_station_cache(df: pd.DataFrame, sha1: str, dropped_rows: int) -> None:
+    tmp = FIRE_STATIONS_CACHE.with_name(FIRE_STATIONS_CACHE.name + ".tmp")
+    try:
+        with tmp.open("wb") as fh:
+            np.savez(
+                fh,
+                name=df["name"].to_numpy(dtype=str),
+                phone=df["phone"].to_numpy(dtype=str),
+                latitude=df["latitude"].to_numpy(dtype=float),
+                longitude=df["longitude"].to_numpy(dtype=float),
+                source_sha1=np.array(sha1),
+                dropped_rows=np.array(dropped_rows),
+            )
+        os.replace(tmp, FIRE_STATIONS_CACHE)
+    except OSError:
+        tmp.unlink(missing_ok=True)  # read‑only deployments simply skip the cache
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _load_station_registry(mtime_ns: int, size: int) -> StationRegistry:
+    """Parse (or restore from cache) one version of the station CSV.
+
+    ``mtime_ns``/``size`` only key the cache; ``mtime_ns < 0`` means no CSV.
+    """
+    if mtime_ns < 0:
+        return StationRegistry(pd.DataFrame(DEFAULT_FIRE_STATIONS, columns=STATION_COLUMNS))
+    sha1 = _file_sha1(FIRE_STATIONS_CSV)
+    cached = _read_station_cache(sha1)
+    if cached is None:
+        raw = pd.read_csv(FIRE_STATIONS_CSV, dtype={"name": str, "phone": str})
+        df, dropped_rows = normalise_station_df(raw)
+        _write_station_cache(df, sha1, dropped_rows)
+    else:
+        df, dropped_rows = cached
+    return StationRegistry(df, source_sha1=sha1, dropped_rows=dropped_rows)
+
+
+def station_registry() -> StationRegistry:
+    """Process‑wide station registry; re‑parsed only when the CSV changes on disk."""
+    try:
+        stat = FIRE_STATIONS_CSV.stat()
+    except FileNotFoundError:
+        return _load_station_registry(-1, 0)
+    return _load_station_registry(stat.st_mtime_ns, stat.st_size)
+
+
 def load_fire_station_df() -> pd.DataFrame:
-    csv_path = Path("fire_stations.csv")
-    if csv_path.exists():
-        return pd.read_csv(csv_path)
-    return pd.DataFrame(DEFAULT_FIRE_STATIONS)
+    return station_registry().df
+
+
+def station_index(stations_df: pd.DataFrame) -> SphericalKDTree:
+    registry = station_registry()
+    if stations_df is registry.df:
+        return registry.index
+    return build_station_index(stations_df)
+
+
+def _with_geodesic_distance(lat: float, lon: float, ranked: pd.DataFrame) -> pd.DataFrame:
+    ranked = ranked.copy()
+    ranked["distance_km"] = [
+        geodesic((lat, lon), (row.latitude, row.longitude)).kilometers
+        for row in ranked.itertuples()
+    ]
+    ranked.sort_values("distance_km", inplace=True, kind="stable")
+    ranked["distance_km"] = ranked["distance_km"].round(2)
+    return ranked
+
+
+KM_PER_DEG = np.pi * EARTH_RADIUS_KM / 180
+
+
+class StationGrid:
+    """Lat/lon raster of per‑cell candidate stations for exact k‑nearest lookups.
+
+    Each cell lists every station within ``d_k(centre) + 2 × half‑diagonal``
+    of its centre, where ``d_k`` is the distance to the ``k``‑th nearest
+    station. For any point in the cell its ``k`` nearest stations are within
+    ``d_k(point) + half‑diagonal`` ≤ that radius, so ranking just the cell's
+    candidates is exact everywhere and the k‑d tree is never needed.
+    """
+
+    TILE = 64  # cells per tile side when filling the raster
+
+    def __init__(self, registry: StationRegistry, k: int, cell_deg: float, margin_deg: float, max_cells: int):
+        lat = registry.df["latitude"].to_numpy(dtype=float)
+        lon = registry.df["longitude"].to_numpy(dtype=float)
+        lat_min, lat_max = lat.min() - margin_deg, lat.max() + margin_deg
+        lon_min, lon_max = lon.min() - margin_deg, lon.max() + margin_deg
+        self.cell = max(cell_deg, np.sqrt((lat_max - lat_min) * (lon_max - lon_min) / max_cells))
+        self.lat0, self.lon0 = lat_min, lon_min
+        self.ny = int(np.ceil((lat_max - lat_min) / self.cell))
+        self.nx = int(np.ceil((lon_max - lon_min) / self.cell))
+        self.k = k
+        # Conservative cell half‑diagonal (longitude degrees only shrink with latitude)
+        self.half_diag_km = self.cell * KM_PER_DEG * np.sqrt(2) / 2
+        self.registry = registry
+        cells = np.arange(self.ny * self.nx)
+        self.radius_km = np.empty(len(cells), dtype=np.float32)
+        self._set_candidates(*self._candidates(cells))
+
+    def _cell_centres(self, cells: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        return (
+            self.lat0 + (cells // self.nx + 0.5) * self.cell,
+            self.lon0 + (cells % self.nx + 0.5) * self.cell,
+        )
+
+    def _candidates(self, cells: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """``(cell, station)`` candidate pairs for ``cells``, one tile at a time; sets ``radius_km``."""
+        index = self.registry.index
+        tiles_x = -(-self.nx // self.TILE)
+        tile = (cells // self.nx // self.TILE) * tiles_x + (cells % self.nx) // self.TILE
+        order = np.argsort(tile, kind="stable")
+        cells, tile = cells[order], tile[order]
+        bounds = np.flatnonzero(np.diff(tile)) + 1
+        tile_half_diag_km = self.TILE * self.half_diag_km
+        pair_cells, pair_stations = [], []
+        for group in np.split(cells, bounds):
+            lat, lon = self._cell_centres(group)
+            t_lat, t_lon = (lat.min() + lat.max()) / 2, (lon.min() + lon.max()) / 2
+            # Every cell's candidate disc lies within d_k(tile centre) + 2 × (tile + cell) half‑diagonals
+            _, near = index.query(t_lat, t_lon, self.k)
+            if len(near) < self.k:
+                cand = np.arange(len(index))
+            else:
+                reach = near[-1] + 2 * (tile_half_diag_km + self.half_diag_km)
+                cand, _ = index.query_radius(t_lat, t_lon, reach)
+            # Squared chord between unit vectors is 2 − 2·cos, i.e. one matrix product
+            chord_sq = np.maximum(2 - 2 * unit_vectors(lat, lon) @ index.xyz[cand].T, 0.0)
+            take = min(self.k, len(cand))
+            d_k = SphericalKDTree.chord_to_km(np.sqrt(np.partition(chord_sq, take - 1, axis=1)[:, take - 1]))
+            radius = d_k + 2 * self.half_diag_km
+            self.radius_km[group] = radius
+            limit = (2 * np.sin(np.minimum(radius / EARTH_RADIUS_KM, np.pi) / 2)) ** 2
+            rows, cols = np.nonzero(chord_sq <= limit[:, None] * (1 + 1e-9))
+            pair_cells.append(group[rows])
+            pair_stations.append(cand[cols])
+        return np.concatenate(pair_cells), np.concatenate(pair_stations)
+
+    def _set_candidates(self, pair_cells: np.ndarray, pair_stations: np.ndarray) -> None:
+        """Store candidate pairs as CSR: ``stations[ptr[c]:ptr[c + 1]]`` for cell ``c``."""
+        order = np.argsort(pair_cells, kind="stable")
+        self.stations = pair_stations[order].astype(np.int32)
+        self.ptr = np.concatenate(([0], np.cumsum(np.bincount(pair_cells, minlength=self.ny * self.nx))))
+
+    def lookup(self, lat: float, lon: float, k: int = 1) -> np.ndarray | None:
+        """Exact positions of the ``k`` nearest stations, nearest first; None outside the grid."""
+        i = int((lat - self.lat0) // self.cell)
+        j = int((lon - self.lon0) // self.cell)
+        if k > self.k or not (0 <= i < self.ny and 0 <= j < self.nx):
+            return None
+        row = i * self.nx + j
+        cand = self.stations[self.ptr[row]:self.ptr[row + 1]]
+        chord = np.linalg.norm(self.registry.index.xyz[cand] - unit_vectors(lat, lon)[0], axis=1)
+        take = min(k, len(cand))
+        top = np.argpartition(chord, take - 1)[:take]
+        return cand[top[np.argsort(chord[top])]]
+
+    def updated(self, registry: StationRegistry, max_changed_fraction: float = 0.05) -> "StationGrid | None":
+        """Copy of the grid patched for a new registry version.
+
+        Cells that listed a moved or removed station are recomputed; added or
+        moved stations join the other cells whose candidate disc they fall in
+        (a new station can only shrink ``d_k``, so those lists stay supersets).
+        Returns None when a full rebuild is preferable.
+        """
+        old_df, new_df = self.registry.df, registry.df
+        if not (old_df["name"].is_unique and new_df["name"].is_unique):
+            return None
+        lat = new_df["latitude"].to_numpy(dtype=float)
+        lon = new_df["longitude"].to_numpy(dtype=float)
+        if (
+            lat.min() < self.lat0
+            or lon.min() < self.lon0
+            or lat.max() >= self.lat0 + self.ny * self.cell
+            or lon.max() >= self.lon0 + self.nx * self.cell
+        ):
+            return None
+
+        new_pos = {name: pos for pos, name in enumerate(new_df["name"])}
+        remap = np.full(len(old_df), -1, dtype=np.int32)
+        stale: List[int] = []
+        for old, row in enumerate(old_df.itertuples(index=False)):
+            new = new_pos.get(row.name, -1)
+            remap[old] = new
+            if new < 0 or (lat[new], lon[new]) != (row.latitude, row.longitude):
+                stale.append(old)
+        old_coords = dict(zip(old_df["name"], zip(old_df["latitude"], old_df["longitude"])))
+        fresh = [
+            pos for pos, name in enumerate(new_df["name"])
+            if old_coords.get(name) != (lat[pos], lon[pos])
+        ]
+        if len(stale) + len(fresh) > max_changed_fraction * max(len(old_df), len(new_df)):
+            return None
+
+        grid = StationGrid.__new__(StationGrid)
+        grid.__dict__.update(self.__dict__)
+        grid.registry = registry
+        grid.radius_km = self.radius_km.copy()
+        pair_cells = np.repeat(np.arange(self.ny * self.nx), np.diff(self.ptr))
+        stale_cells = np.zeros(self.ny * self.nx, dtype=bool)
+        stale_cells[pair_cells[np.isin(self.stations, stale)]] = True
+        keep = ~stale_cells[pair_cells]
+        pairs = [(pair_cells[keep], remap[self.stations[keep]])]
+
+        live = np.flatnonzero(~stale_cells)
+        lat_c, lon_c = grid._cell_centres(live)
+        cell_xyz = unit_vectors(lat_c, lon_c)
+        for pos in fresh:
+            d = SphericalKDTree.chord_to_km(np.linalg.norm(cell_xyz - registry.index.xyz[pos], axis=1))
+            rows = live[d <= grid.radius_km[live]]
+            pairs.append((rows, np.full(len(rows), pos, dtype=np.int32)))
+        pairs.append(grid._candidates(np.flatnonzero(stale_cells)))
+        grid._set_candidates(*(np.concatenate(parts) for parts in zip(*pairs)))
+        return grid
+
+
+class _StationGridHolder:
+    def __init__(self):
+        self.grid: StationGrid | None = None
+        self.building: str | None = None  # registry version being built in the background
+        self.lock = threading.Lock()
+
+    def build(self, registry: StationRegistry) -> None:
+        grid = (self.grid and self.grid.updated(registry)) or StationGrid(
+            registry, 1 + BACKUP_STATION_COUNT, STATION_GRID_CELL_DEG,
+            STATION_GRID_MARGIN_DEG, STATION_GRID_MAX_CELLS,
+        )
+        with self.lock:
+            if self.building == registry.version:
+                self.grid, self.building = grid, None
+
+
+@st.cache_resource(show_spinner=False)
+def _station_grid_holder() -> _StationGridHolder:
+    return _StationGridHolder()
+
+
+def station_grid() -> StationGrid | None:
+    """Process‑wide lookup grid for the current registry; None while it is being built.
+
+    Builds and incremental patches run on a background thread, so no request
+    waits for them; lookups fall back to the k‑d tree meanwhile.
+    """
+    registry = station_registry()
+    holder = _station_grid_holder()
+    with holder.lock:
+        if holder.grid is not None and holder.grid.registry.version == registry.version:
+            return holder.grid
+        if holder.building != registry.version:
+            holder.building = registry.version
+            threading.Thread(target=holder.build, args=(registry,), daemon=True).start()
+    return None
+
+
+def nearest_station_positions(lats, lons, stations_df: pd.DataFrame, k: int = 1):
+    """Batch k‑nearest lookup for one or many query points.
+
+    Each point takes its shortlist from the lookup grid (registry frame, once
+    built) or the k‑d tree, and only that shortlist is re‑ranked with the
+    exact geodesic. Returns ``(positions, distances_km)``, both ``(n_points, k)``.
+    """
+    q_lat = np.atleast_1d(np.asarray(lats, dtype=float))
+    q_lon = np.atleast_1d(np.asarray(lons, dtype=float))
+    k = min(k, len(stations_df))
+    grid = station_grid() if stations_df is station_registry().df else None
+    index = station_index(stations_df)
+    st_lat = stations_df["latitude"].to_numpy(dtype=float)
+    st_lon = stations_df["longitude"].to_numpy(dtype=float)
+    positions = np.empty((len(q_lat), k), dtype=int)
+    distances = np.empty((len(q_lat), k))
+    for row, (lat, lon) in enumerate(zip(q_lat, q_lon)):
+        candidates = grid.lookup(lat, lon, k) if grid is not None else None
+        if candidates is None:
+            candidates, _ = index.query(lat, lon, max(k, GEODESIC_REFINE_TOP_K))
+        exact = geodesic_km(lat, lon, st_lat[candidates], st_lon[candidates])
+        order = np.argsort(exact, kind="stable")[:k]
+        positions[row], distances[row] = candidates[order], exact[order]
+    return positions, distances
+
+
+def nearest_fire_stations(
+    lat: float, lon: float, stations_df: pd.DataFrame, k: int = 1 + BACKUP_STATION_COUNT
+) -> pd.DataFrame:
+    """Primary station followed by ranked backups, with geodesic ``distance_km``."""
+    positions, distances = nearest_station_positions(lat, lon, stations_df, k)
+    ranked = stations_df.iloc[positions[0]].copy()
+    ranked["distance_km"] = distances[0].round(2)
+    return ranked
+
+
+def fire_stations_within(
+    lat: float, lon: float, radius_km: float, stations_df: pd.DataFrame
+) -> pd.DataFrame:
+    """All stations within ``radius_km`` of a point, nearest first."""
+    index = station_index(stations_df)
+    candidates, _ = index.query_radius(lat, lon, radius_km)
+    ranked = _with_geodesic_distance(lat, lon, stations_df.iloc[candidates])
+    return ranked[ranked["distance_km"] <= radius_km]
+
+
+class RoadGraph:
+    """Directed road graph in CSR form with travel‑time edge weights (seconds)."""
+
+    def __init__(self, lats, lons, edges_from, edges_to, lengths_km, speeds_kmph):
+        self.lat = np.asarray(lats, dtype=float)
+        self.lon = np.asarray(lons, dtype=float)
+        self.xyz = unit_vectors(self.lat, self.lon)
+        edges_from = np.asarray(edges_from, dtype=np.int64)
+        order = np.argsort(edges_from, kind="stable")
+        self.indptr = np.searchsorted(edges_from[order], np.arange(len(self.lat) + 1))
+        self.indices = np.asarray(edges_to, dtype=np.int64)[order]
+        self.length_km = np.asarray(lengths_km, dtype=float)[order]
+        self.seconds = self.length_km / np.asarray(speeds_kmph, dtype=float)[order] * 3600
+        self.max_speed_kmph = float(np.max(speeds_kmph)) if len(order) else ROAD_DEFAULT_SPEED_KMPH
+        self.node_index = SphericalKDTree(self.lat, self.lon)
+        # Reverse adjacency (edge ids grouped by head node) for one‑to‑all‑sources queries
+        self._rev_edges = np.argsort(self.indices, kind="stable")
+        self._rev_indptr = np.searchsorted(self.indices[self._rev_edges], np.arange(len(self.lat) + 1))
+        self._tails = np.repeat(np.arange(len(self.lat)), np.diff(self.indptr))
+        # LRU of recent (src, dst) routes; bounded since GPS / room snaps are open‑ended
+        self._routes: OrderedDict[tuple[int, int], tuple[List[int], float, float] | None] = OrderedDict()
+        self._routes_lock = threading.Lock()
 
+    @classmethod
+    def from_osm_xml(cls, path: Path) -> "RoadGraph":
+        """Build the graph from an OSM XML extract, keeping only drivable ways."""
+        node_pos: dict[int, tuple[float, float]] = {}
+        ways: List[tuple[List[int], float, int]] = []
+        for _, elem in ET.iterparse(path, events=("end",)):
+            if elem.tag == "node":
+                node_pos[int(elem.get("id"))] = (float(elem.get("lat")), float(elem.get("lon")))
+            elif elem.tag == "way":
+                tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+                highway = tags.get("highway")
+                if highway in ROAD_SPEED_KMPH:
+                    refs = [int(nd.get("ref")) for nd in elem.iter("nd")]
+                    oneway = tags.get("oneway", "yes" if highway == "motorway" else "no")
+                    direction = {"yes": 1, "true": 1, "1": 1, "-1": -1}.get(oneway, 0)
+                    ways.append((refs, ROAD_SPEED_KMPH[highway], direction))
+            if elem.tag in {"node", "way", "relation"}:
+                elem.clear()
 
-def haversine_km(p1: tuple[float, float], p2: tuple[float, float]) -> float:
-    """Wrapper around geodesic distance returning km with 2‑dec precision."""
-    return round(geodesic(p1, p2).kilometers, 2)
+        ids: dict[int, int] = {}
+        frm: List[int] = []
+        to: List[int] = []
+        speeds: List[float] = []
+        for refs, speed, direction in ways:
+            refs = [ref for ref in refs if ref in node_pos]
+            for a, b in zip(refs, refs[1:]):
+                ia, ib = ids.setdefault(a, len(ids)), ids.setdefault(b, len(ids))
+                if direction >= 0:
+                    frm.append(ia)
+                    to.append(ib)
+                    speeds.append(speed)
+                if direction <= 0:
+                    frm.append(ib)
+                    to.append(ia)
+                    speeds.append(speed)
+        coords = np.array([node_pos[ref] for ref in ids], dtype=float).reshape(-1, 2)
+        xyz = unit_vectors(coords[:, 0], coords[:, 1])
+        lengths = SphericalKDTree.chord_to_km(np.linalg.norm(xyz[frm] - xyz[to], axis=1))
+        return cls(coords[:, 0], coords[:, 1], frm, to, lengths, speeds)
 
+    def snap(self, lat: float, lon: float) -> tuple[int, float]:
+        """Nearest graph node and the straight‑line km to reach it."""
+        idx, dist = self.node_index.query(lat, lon, 1)
+        return int(idx[0]), float(dist[0])
 
-def nearest_fire_station(lat: float, lon: float, stations_df: pd.DataFrame):
-    stations_df = stations_df.copy()
-    stations_df["distance_km"] = stations_df.apply(
-        lambda row: haversine_km((lat, lon), (row.latitude, row.longitude)), axis=1
+    def _astar(self, src: int, dst: int) -> tuple[List[int], float, float] | None:
+        """Fastest path by A*; the heuristic (straight line at top speed) is admissible."""
+        key = (src, dst)
+        with self._routes_lock:
+            if key in self._routes:
+                self._routes.move_to_end(key)
+                return self._routes[key]
+        chord = np.linalg.norm(self.xyz - self.xyz[dst], axis=1)
+        h = SphericalKDTree.chord_to_km(chord) / self.max_speed_kmph * 3600
+        best = {src: 0.0}
+        parent = {src: -1}
+        closed = set()
+        frontier = [(h[src], src)]
+        found = False
+        while frontier:
+            _, u = heapq.heappop(frontier)
+            if u == dst:
+                found = True
+                break
+            if u in closed:
+                continue
+            closed.add(u)
+            for e in range(self.indptr[u], self.indptr[u + 1]):
+                v = int(self.indices[e])
+                cost = best[u] + self.seconds[e]
+                if cost < best.get(v, np.inf):
+                    best[v] = cost
+                    parent[v] = (u, e)
+                    heapq.heappush(frontier, (cost + h[v], v))
+        result = None
+        if found:
+            nodes, km = [dst], 0.0
+            while parent[nodes[-1]] != -1:
+                u, e = parent[nodes[-1]]
+                km += self.length_km[e]
+                nodes.append(u)
+            result = (nodes[::-1], best[dst], km)
+        with self._routes_lock:
+            self._routes[key] = result
+            if len(self._routes) > ROAD_ROUTE_CACHE_SIZE:
+                self._routes.popitem(last=False)
+        return result
+
+    def travel_to(self, dst: int) -> tuple[np.ndarray, np.ndarray]:
+        """Fastest travel ``(seconds, km)`` from every node to ``dst`` (Dijkstra on reversed edges)."""
+        seconds = np.full(len(self.lat), np.inf)
+        km = np.full(len(self.lat), np.inf)
+        seconds[dst] = km[dst] = 0.0
+        frontier = [(0.0, dst)]
+        while frontier:
+            cost, v = heapq.heappop(frontier)
+            if cost > seconds[v]:
+                continue
+            for e in self._rev_edges[self._rev_indptr[v]:self._rev_indptr[v + 1]]:
+                u = self._tails[e]
+                if cost + self.seconds[e] < seconds[u]:
+                    seconds[u] = cost + self.seconds[e]
+                    km[u] = km[v] + self.length_km[e]
+                    heapq.heappush(frontier, (seconds[u], u))
+        return seconds, km
+
+    def route(self, from_lat: float, from_lon: float, to_lat: float, to_lon: float) -> dict | None:
+        """Fastest road route; returns ``{"path", "distance_km", "eta_min"}`` or None."""
+        src, src_gap = self.snap(from_lat, from_lon)
+        dst, dst_gap = self.snap(to_lat, to_lon)
+        found = self._astar(src, dst)
+        if found is None:
+            return None
+        nodes, seconds, km = found
+        off_road_km = src_gap + dst_gap
+        seconds += off_road_km / ROAD_DEFAULT_SPEED_KMPH * 3600
+        return {
+            "path": [(from_lat, from_lon)]
+            + [(self.lat[n], self.lon[n]) for n in nodes]
+            + [(to_lat, to_lon)],
+            "distance_km": round(km + off_road_km, 2),
+            "eta_min": int(seconds / 60),
+        }
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _load_road_graph(mtime_ns: int) -> RoadGraph:
+    return RoadGraph.from_osm_xml(ROAD_GRAPH_PATH)
+
+
+def road_graph() -> RoadGraph | None:
+    """Offline road graph, or None when no OSM extract is installed."""
+    try:
+        return _load_road_graph(ROAD_GRAPH_PATH.stat().st_mtime_ns)
+    except FileNotFoundError:
+        return None
+
+
+def with_response_eta(ranked: pd.DataFrame, lat: float, lon: float) -> pd.DataFrame:
+    """Add ``eta_min`` and ``route`` to ranked stations and re‑rank by ETA.
+
+    Uses road routing when an OSM extract is available, otherwise straight‑line
+    distance at ``AVG_FIRE_TRUCK_SPEED_KMPH``.
+    """
+    ranked = ranked.copy()
+    graph = road_graph()
+    routes = [
+        graph.route(row.latitude, row.longitude, lat, lon) if graph else None
+        for row in ranked.itertuples()
+    ]
+    ranked["route"] = routes
+    ranked["eta_min"] = [
+        route["eta_min"] if route else int((row.distance_km / AVG_FIRE_TRUCK_SPEED_KMPH) * 60)
+        for row, route in zip(ranked.itertuples(), routes)
+    ]
+    ranked["road_km"] = [
+        route["distance_km"] if route else row.distance_km
+        for row, route in zip(ranked.itertuples(), routes)
+    ]
+    return ranked.sort_values("eta_min", kind="stable")
+
+
+def _content_sha1(obj) -> str:
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class EtaMatrix:
+    """Campus POI × station straight‑line distance, road distance and ETA tables."""
+
+    def __init__(self, poi_names, distance_km, road_km, eta_min):
+        self.poi_row = {name: row for row, name in enumerate(poi_names)}
+        self.distance_km = np.asarray(distance_km, dtype=np.float32)
+        self.road_km = np.asarray(road_km, dtype=np.float32)
+        self.eta_min = np.asarray(eta_min, dtype=np.float32)
+
+    @classmethod
+    def compute(cls, pois: List[dict], stations_df: pd.DataFrame, graph: RoadGraph | None) -> "EtaMatrix":
+        poi_lat = np.array([p["latitude"] for p in pois], dtype=float)
+        poi_lon = np.array([p["longitude"] for p in pois], dtype=float)
+        # Geodesic like every other distance in the sidebar; this runs off the request path
+        distance = station_distance_matrix_km(poi_lat, poi_lon, stations_df, backend="geodesic")
+        if graph is None:
+            road = distance
+            eta = distance / AVG_FIRE_TRUCK_SPEED_KMPH * 60
+        else:
+            snapped = [
+                graph.snap(row.latitude, row.longitude) for row in stations_df.itertuples()
+            ]
+            st_node = np.array([node for node, _ in snapped], dtype=np.int64)
+            st_gap = np.array([gap for _, gap in snapped], dtype=float)
+            road = np.empty_like(distance)
+            eta = np.empty_like(distance)
+            for row, (lat, lon) in enumerate(zip(poi_lat, poi_lon)):
+                poi_node, poi_gap = graph.snap(lat, lon)
+                seconds, km = graph.travel_to(poi_node)
+                off_road = st_gap + poi_gap
+                road[row] = km[st_node] + off_road
+                eta[row] = (seconds[st_node] + off_road / ROAD_DEFAULT_SPEED_KMPH * 3600) / 60
+        return cls([p["name"] for p in pois], distance, road, eta)
+
+    def save(self, path: Path, key: str) -> None:
+        tmp = path.with_name(path.name + ".tmp")
+        try:
+            with tmp.open("wb") as fh:
+                np.savez(
+                    fh,
+                    key=np.array(key),
+                    poi_names=np.array(list(self.poi_row), dtype=str),
+                    distance_km=self.distance_km,
+                    road_km=self.road_km,
+                    eta_min=self.eta_min,
+                )
+            os.replace(tmp, path)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+
+    @classmethod
+    def load(cls, path: Path, key: str) -> "EtaMatrix | None":
+        try:
+            with np.load(path, allow_pickle=False) as cache:
+                if str(cache["key"]) != key:
+                    return None
+                return cls(cache["poi_names"], cache["distance_km"], cache["road_km"], cache["eta_min"])
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def ranked(self, poi_name: str, stations_df: pd.DataFrame, k: int) -> pd.DataFrame | None:
+        """Fastest ``k`` stations for a catalogued POI, or None if it is unknown."""
+        row = self.poi_row.get(poi_name)
+        if row is None:
+            return None
+        distance = self.distance_km[row].astype(float)
+        eta = self.eta_min[row].astype(float)
+        road = self.road_km[row].astype(float)
+        # Stations the road graph cannot reach fall back to straight line, as in with_response_eta
+        unreachable = ~np.isfinite(eta)
+        eta[unreachable] = distance[unreachable] / AVG_FIRE_TRUCK_SPEED_KMPH * 60
+        road[unreachable] = distance[unreachable]
+        k = min(k, len(eta))
+        top = np.argpartition(eta, k - 1)[:k]
+        top = top[np.argsort(eta[top], kind="stable")]
+        ranked = stations_df.iloc[top].copy()
+        ranked["distance_km"] = np.round(distance[top], 2)
+        ranked["road_km"] = np.round(road[top], 2)
+        ranked["eta_min"] = eta[top].astype(int)
+        return ranked
+
+
+class EtaMatrixService:
+    """Builds (or restores) the POI × station ETA matrix on a background thread."""
+
+    def __init__(self, key: str, pois: List[dict], stations_df: pd.DataFrame, graph: RoadGraph | None):
+        self.key = key
+        self.matrix = EtaMatrix.load(ETA_MATRIX_CACHE, key)
+        if self.matrix is None:
+            threading.Thread(
+                target=self._build, args=(pois, stations_df, graph), daemon=True
+            ).start()
+
+    def _build(self, pois: List[dict], stations_df: pd.DataFrame, graph: RoadGraph | None) -> None:
+        matrix = EtaMatrix.compute(pois, stations_df, graph)
+        matrix.save(ETA_MATRIX_CACHE, self.key)
+        self.matrix = matrix
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _eta_matrix_service(key: str, _stations_df: pd.DataFrame, _graph: RoadGraph | None) -> EtaMatrixService:
+    return EtaMatrixService(key, CAMPUS_LOCATIONS, _stations_df, _graph)
+
+
+def eta_matrix() -> EtaMatrix | None:
+    """Current POI × station matrix, or None while it is still being built."""
+    registry = station_registry()
+    graph = road_graph()
+    key = _content_sha1(
+        {
+            "pois": [(p["name"], p["latitude"], p["longitude"]) for p in CAMPUS_LOCATIONS],
+            "stations": registry.version,
+            "roads": ROAD_GRAPH_PATH.stat().st_mtime_ns if graph else None,
+            "speeds": [ROAD_SPEED_KMPH, ROAD_DEFAULT_SPEED_KMPH, AVG_FIRE_TRUCK_SPEED_KMPH],
+            "distance": "geodesic",
+        }
+    )
+    return _eta_matrix_service(key, registry.df, graph).matrix
+
+
+def ranked_response_stations(
+    lat: float, lon: float, poi_name: str | None = None, k: int = 1 + BACKUP_STATION_COUNT
+) -> pd.DataFrame:
+    """Fastest responding stations with ``eta_min``/``road_km`` and a ``route`` for the first.
+
+    Catalogued POIs are a lookup in the precomputed matrix; anything else (or a
+    matrix still being built) falls back to a live k‑nearest + routing query.
+    """
+    stations_df = load_fire_station_df()
+    matrix = eta_matrix() if poi_name else None
+    ranked = matrix.ranked(poi_name, stations_df, k) if matrix else None
+    if ranked is None:
+        return with_response_eta(nearest_fire_stations(lat, lon, stations_df, k), lat, lon)
+    # Route geometry is only needed for the station that is drawn on the map
+    routes = [None] * len(ranked)
+    graph = road_graph()
+    if graph:
+        first = ranked.iloc[0]
+        routes[0] = graph.route(first.latitude, first.longitude, lat, lon)
+    ranked["route"] = routes
+    return ranked
+
+
+class EvacuationRouter:
+    """Shortest walking routes from every campus path node to its nearest assembly point.
+
+    One multi‑source Dijkstra seeded at all assembly points yields, for every
+    node, the walking time to safety and the next hop towards it.
+    """
+
+    def __init__(self, nodes: dict, edges: List[tuple], assembly_points: dict):
+        self.nodes = dict(nodes)
+        self.assembly_points = dict(assembly_points)
+        self.adj: dict[str, dict[str, float]] = {node: {} for node in self.nodes}
+        self.weights: dict[tuple[str, str], float] = {}
+        for a, b in edges:
+            seconds = 1000 * equirectangular_km(*self.nodes[a], *self.nodes[b]) / WALKING_SPEED_MPS
+            self.adj[a][b] = self.adj[b][a] = seconds
+            self.weights[self.edge_key(a, b)] = seconds
+        self.blocked: set[tuple[str, str]] = set()
+        self.seconds = {node: np.inf for node in self.nodes}
+        self.next_hop: dict[str, str | None] = {node: None for node in self.nodes}
+        self.children: dict[str, set[str]] = {node: set() for node in self.nodes}
+        frontier = []
+        for point in self.assembly_points:
+            self.seconds[point] = 0.0
+            frontier.append((0.0, point))
+        self._propagate(frontier)
+
+    @staticmethod
+    def edge_key(a: str, b: str) -> tuple[str, str]:
+        return (a, b) if a <= b else (b, a)
+
+    def _set_hop(self, node: str, hop: str | None) -> None:
+        if self.next_hop[node] is not None:
+            self.children[self.next_hop[node]].discard(node)
+        self.next_hop[node] = hop
+        if hop is not None:
+            self.children[hop].add(node)
+
+    def _propagate(self, frontier: List[tuple[float, str]]) -> set[str]:
+        """Dijkstra from already‑labelled nodes; returns the nodes it improved."""
+        heapq.heapify(frontier)
+        changed = set()
+        while frontier:
+            cost, v = heapq.heappop(frontier)
+            if cost > self.seconds[v]:
+                continue
+            for u, seconds in self.adj[v].items():
+                if cost + seconds < self.seconds[u]:
+                    self.seconds[u] = cost + seconds
+                    self._set_hop(u, v)
+                    changed.add(u)
+                    heapq.heappush(frontier, (self.seconds[u], u))
+        return changed
+
+    def block_edge(self, a: str, b: str) -> set[str]:
+        """Mark a corridor impassable and repair only the routes that used it.
+
+        Returns the nodes whose route changed.
+        """
+        key = self.edge_key(a, b)
+        if key in self.blocked or key not in self.weights:
+            return set()
+        self.blocked.add(key)
+        del self.adj[a][b], self.adj[b][a]
+        if self.next_hop[a] == b:
+            root = a
+        elif self.next_hop[b] == a:
+            root = b
+        else:
+            return set()  # not on any shortest route
+        # Routes of the whole subtree hanging off the blocked edge are invalid
+        subtree, stack = set(), [root]
+        while stack:
+            node = stack.pop()
+            subtree.add(node)
+            stack.extend(self.children[node])
+        for node in subtree:
+            self.seconds[node] = np.inf
+            self._set_hop(node, None)
+        # Re‑attach the subtree from its intact boundary, then settle inwards
+        frontier = []
+        for node in subtree:
+            for nbr, seconds in self.adj[node].items():
+                if nbr not in subtree and self.seconds[nbr] + seconds < self.seconds[node]:
+                    self.seconds[node] = self.seconds[nbr] + seconds
+                    self._set_hop(node, nbr)
+            if np.isfinite(self.seconds[node]):
+                frontier.append((self.seconds[node], node))
+        self._propagate(frontier)
+        return subtree
+
+    def unblock_edge(self, a: str, b: str) -> set[str]:
+        """Reopen a corridor; only routes that get faster through it are updated."""
+        key = self.edge_key(a, b)
+        if key not in self.blocked:
+            return set()
+        self.blocked.discard(key)
+        seconds = self.weights[key]
+        self.adj[a][b] = self.adj[b][a] = seconds
+        return self._propagate([(self.seconds[a], a), (self.seconds[b], b)])
+
+    def route_from_node(self, node: str) -> List[str] | None:
+        if not np.isfinite(self.seconds.get(node, np.inf)):
+            return None
+        path = [node]
+        while self.next_hop[path[-1]] is not None:
+            path.append(self.next_hop[path[-1]])
+        return path
+
+    def route_for_location(self, loc: dict) -> dict | None:
+        """Fastest route from any exit of a campus location to the nearest assembly point.
+
+        Returns ``{"path": [(lat, lon), ...], "seconds", "exit", "assembly"}``.
+        """
+        exits = [node for node in loc.get("exits", []) if node in self.seconds]
+        if not exits:
+            return None
+        exit_node = min(exits, key=self.seconds.__getitem__)
+        nodes = self.route_from_node(exit_node)
+        if nodes is None:
+            return None
+        return {
+            "path": [(loc["latitude"], loc["longitude"])] + [self.nodes[n] for n in nodes],
+            "seconds": self.seconds[exit_node],
+            "exit": exit_node,
+            "assembly": self.assembly_points[nodes[-1]],
+        }
+
+
+@st.cache_resource(show_spinner=False)
+def _base_evacuation_router() -> EvacuationRouter:
+    return EvacuationRouter(CAMPUS_PATH_NODES, CAMPUS_PATH_EDGES, CAMPUS_ASSEMBLY_POINTS)
+
+
+def evacuation_router() -> EvacuationRouter:
+    """This session's router; blocked corridors are per session."""
+    if "evac_router" not in st.session_state:
+        st.session_state.evac_router = copy.deepcopy(_base_evacuation_router())
+    return st.session_state.evac_router
+
+
+class FlowNetwork:
+    """Residual network with Dinic's max‑flow (float capacities)."""
+
+    EPS = 1e-9
+
+    def __init__(self, n_nodes: int):
+        self.head: List[List[int]] = [[] for _ in range(n_nodes)]
+        self.to: List[int] = []
+        self.cap: List[float] = []
+
+    def add_edge(self, u: int, v: int, capacity: float) -> int:
+        """Add ``u → v``; returns the arc id (its reverse arc is ``id ^ 1``)."""
+        arc = len(self.to)
+        self.to += [v, u]
+        self.cap += [capacity, 0.0]
+        self.head[u].append(arc)
+        self.head[v].append(arc + 1)
+        return arc
+
+    def _levels(self, s: int) -> List[int]:
+        level = [-1] * len(self.head)
+        level[s] = 0
+        queue = [s]
+        for u in queue:
+            for arc in self.head[u]:
+                v = self.to[arc]
+                if level[v] < 0 and self.cap[arc] > self.EPS:
+                    level[v] = level[u] + 1
+                    queue.append(v)
+        return level
+
+    def max_flow(self, s: int, t: int) -> float:
+        total = 0.0
+        while True:
+            level = self._levels(s)
+            if level[t] < 0:
+                return total
+            it = [0] * len(self.head)
+            while True:
+                # Iterative DFS for one augmenting path in the level graph
+                stack, path = [s], []
+                while stack and stack[-1] != t:
+                    u = stack[-1]
+                    while it[u] < len(self.head[u]):
+                        arc = self.head[u][it[u]]
+                        v = self.to[arc]
+                        if self.cap[arc] > self.EPS and level[v] == level[u] + 1:
+                            stack.append(v)
+                            path.append(arc)
+                            break
+                        it[u] += 1
+                    else:
+                        stack.pop()  # dead end
+                        if path:
+                            path.pop()
+                        if stack:
+                            it[stack[-1]] += 1
+                if not stack:
+                    break
+                pushed = min(self.cap[arc] for arc in path)
+                for arc in path:
+                    self.cap[arc] -= pushed
+                    self.cap[arc ^ 1] += pushed
+                total += pushed
+
+    def source_side(self, s: int) -> List[bool]:
+        """Nodes reachable from ``s`` in the residual graph (the min‑cut source side)."""
+        return [lvl >= 0 for lvl in self._levels(s)]
+
+
+def _time_expanded_evacuation(
+    router: EvacuationRouter, exits: List[str], occupancy: int, steps: int
+) -> tuple[float, FlowNetwork, int, dict[int, str]]:
+    """Max flow of evacuees reaching an assembly point within ``steps`` time steps.
+
+    Node ``(v, t)`` is path node ``v`` at step ``t``. People may wait in place,
+    walk a corridor (``ceil(time / step)`` steps, capacity per step from its
+    throughput) and leave the building through each exit door at the door rate.
+    """
+    nodes = list(router.nodes)
+    pos = {node: i for i, node in enumerate(nodes)}
+    layer = steps + 1
+    source, feed, sink = len(nodes) * layer, len(nodes) * layer + 1, len(nodes) * layer + 2
+    net = FlowNetwork(len(nodes) * layer + 3)
+    at = lambda node, t: pos[node] * layer + t  # noqa: E731
+    per_step = EVAC_TIME_STEP_S / 60
+    labels: dict[int, str] = {}
+
+    net.add_edge(source, feed, float(occupancy))
+    for exit_node in exits:
+        for t in range(layer):
+            arc = net.add_edge(feed, at(exit_node, t), EXIT_CAPACITY_PPM * per_step)
+            labels[arc] = f"exit door {exit_node.replace('_', ' ')}"
+    for node in nodes:
+        for t in range(steps):
+            net.add_edge(at(node, t), at(node, t + 1), np.inf)
+    for (a, b), seconds in router.weights.items():
+        if (a, b) in router.blocked:
+            continue
+        lag = max(1, int(np.ceil(seconds / EVAC_TIME_STEP_S)))
+        capacity = CORRIDOR_CAPACITY_PPM.get((a, b), CORRIDOR_DEFAULT_CAPACITY_PPM) * per_step
+        label = " ↔ ".join(n.replace("_", " ") for n in (a, b))
+        for u, v in ((a, b), (b, a)):
+            for t in range(layer - lag):
+                labels[net.add_edge(at(u, t), at(v, t + lag), capacity)] = label
+    for point in router.assembly_points:
+        for t in range(layer):
+            net.add_edge(at(point, t), sink, np.inf)
+    return net.max_flow(source, sink), net, source, labels
+
+
+@st.cache_data(show_spinner=False)
+def evacuation_capacity(
+    location_name: str, occupancy: int, blocked: tuple[tuple[str, str], ...] = ()
+) -> dict:
+    """Clearance time and bottlenecks for one building and occupancy scenario.
+
+    Finds the smallest time horizon whose time‑expanded max flow evacuates
+    everyone, then reports the corridors/doors cut when one step shorter.
+    Results are cached per (location, occupancy, blocked corridors).
+    """
+    router = copy.deepcopy(_base_evacuation_router())
+    for edge in blocked:
+        router.block_edge(*edge)
+    loc = next(loc for loc in CAMPUS_LOCATIONS if loc["name"] == location_name)
+    exits = [node for node in loc.get("exits", []) if node in router.nodes]
+    result = {"location": location_name, "occupancy": occupancy, "clearance_s": None, "bottlenecks": []}
+    if not exits or occupancy <= 0:
+        result["clearance_s"] = 0 if exits else None
+        return result
+
+    def evacuated(steps: int) -> float:
+        return _time_expanded_evacuation(router, exits, occupancy, steps)[0]
+
+    fastest = min(router.seconds[e] for e in exits)
+    if not np.isfinite(fastest):
+        return result  # every route to safety is blocked
+    max_steps = int(EVAC_MAX_HORIZON_S // EVAC_TIME_STEP_S)
+    lo, hi = 0, max(1, int(fastest // EVAC_TIME_STEP_S))
+    while evacuated(hi) < occupancy - FlowNetwork.EPS:
+        if hi >= max_steps:
+            return result  # cannot clear within the planning horizon
+        lo, hi = hi, min(2 * hi, max_steps)
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if evacuated(mid) >= occupancy - FlowNetwork.EPS:
+            hi = mid
+        else:
+            lo = mid
+    result["clearance_s"] = hi * EVAC_TIME_STEP_S
+
+    # Saturated arcs leaving the min‑cut source side one step short of clearance
+    _, net, source, labels = _time_expanded_evacuation(router, exits, occupancy, hi - 1)
+    reachable = net.source_side(source)
+    saturated: dict[str, int] = {}
+    for arc, label in labels.items():
+        u = net.to[arc ^ 1]
+        if reachable[u] and not reachable[net.to[arc]]:
+            saturated[label] = saturated.get(label, 0) + 1
+    result["bottlenecks"] = sorted(saturated, key=saturated.get, reverse=True)
+    return result
+
+
+def drill_scenario(location_name: str, blocked: tuple[tuple[str, str], ...] = ()) -> dict | None:
+    """Plain‑array description of a building's evacuation routes for the simulator.
+
+    One route per open exit; routes are padded to equal length so agents can be
+    advanced with array indexing. Returns None if no exit has a route.
+    """
+    router = copy.deepcopy(_base_evacuation_router())
+    for edge in blocked:
+        router.block_edge(*edge)
+    loc = next(loc for loc in CAMPUS_LOCATIONS if loc["name"] == location_name)
+    corridors = sorted(router.weights)
+    corridor_pos = {edge: i for i, edge in enumerate(corridors)}
+    routes = []
+    for exit_node in loc.get("exits", []):
+        nodes = router.route_from_node(exit_node)
+        if nodes is not None:
+            routes.append([router.edge_key(a, b) for a, b in zip(nodes, nodes[1:])])
+    if not routes:
+        return None
+    width = max(len(route) for route in routes) + 1  # spare column for finished agents
+    route_corridor = np.full((len(routes), width), -1, dtype=np.int64)
+    route_cum_m = np.full((len(routes), width), np.inf)
+    for r, route in enumerate(routes):
+        lengths = [router.weights[edge] * WALKING_SPEED_MPS for edge in route]
+        route_corridor[r, : len(route)] = [corridor_pos[edge] for edge in route]
+        route_cum_m[r, : len(route)] = np.cumsum(lengths)
+    capacity_pps = np.array(
+        [CORRIDOR_CAPACITY_PPM.get(edge, CORRIDOR_DEFAULT_CAPACITY_PPM) / 60 for edge in corridors]
     )
-    stations_df.sort_values("distance_km", inplace=True)
-    return stations_df.iloc[0]
+    return {
+        "route_corridor": route_corridor,
+        "route_cum_m": route_cum_m,
+        "route_len_m": np.array([cum[np.isfinite(cum)].max(initial=0.0) for cum in route_cum_m]),
+        "corridor_len_m": np.array([router.weights[edge] * WALKING_SPEED_MPS for edge in corridors]),
+        # Effective width from throughput at the optimal specific flow
+        "corridor_width_m": capacity_pps / DRILL_SPECIFIC_FLOW_PPSM,
+    }
+
+
+def simulate_drill(scenario: dict, occupancy: int, seed: int) -> float:
+    """One agent‑based evacuation run; returns the clearance time in seconds.
+
+    Agents get a random pre‑movement delay and walking speed, queue through
+    their exit door at ``EXIT_CAPACITY_PPM`` and slow down linearly with crowd
+    density on the corridor they occupy. All agents advance in one NumPy step.
+    """
+    rng = np.random.default_rng(seed)
+    n_routes = len(scenario["route_len_m"])
+    route = rng.integers(0, n_routes, occupancy)
+    free_speed = np.clip(
+        rng.normal(WALKING_SPEED_MPS, DRILL_SPEED_SD_MPS, occupancy), 0.3 * WALKING_SPEED_MPS, None
+    )
+    ready = rng.lognormal(np.log(DRILL_PREMOVEMENT_MEDIAN_S), DRILL_PREMOVEMENT_SIGMA, occupancy)
+
+    # Door queue per exit: release_i = max(ready_i, release_{i-1} + headway)
+    release = np.empty(occupancy)
+    headway = 60 / EXIT_CAPACITY_PPM
+    for r in range(n_routes):
+        members = np.flatnonzero(route == r)
+        members = members[np.argsort(ready[members])]
+        slots = np.arange(len(members)) * headway
+        release[members] = np.maximum.accumulate(ready[members] - slots) + slots
+
+    cum = scenario["route_cum_m"]
+    corridor = scenario["route_corridor"]
+    route_len = scenario["route_len_m"][route]
+    area = scenario["corridor_len_m"] * scenario["corridor_width_m"]
+    s = np.zeros(occupancy)
+    arrival = np.full(occupancy, np.inf)
+    t = 0.0
+    while t <= EVAC_MAX_HORIZON_S:
+        active = (release <= t) & ~np.isfinite(arrival)
+        finished = active & (s >= route_len)
+        arrival[finished] = t
+        moving = np.flatnonzero(active & ~finished)
+        if not len(moving) and np.isfinite(arrival).all():
+            break
+        if len(moving):
+            leg = (s[moving, None] >= cum[route[moving]]).sum(axis=1)
+            on = corridor[route[moving], leg]
+            density = np.bincount(on, minlength=len(area)) / area
+            factor = np.clip(1 - density[on] / DRILL_JAM_DENSITY_PPM2, DRILL_MIN_SPEED_FRACTION, 1.0)
+            s[moving] += free_speed[moving] * factor * DRILL_TIME_STEP_S
+        t += DRILL_TIME_STEP_S
+    return float(arrival.max())
+
+
+def _simulate_drill_batch(scenario: dict, occupancy: int, seeds: List[int]) -> List[float]:
+    return [simulate_drill(scenario, occupancy, seed) for seed in seeds]
+
+
+@st.cache_data(show_spinner=False)
+def drill_clearance_times(
+    location_name: str, occupancy: int, runs: int, blocked: tuple[tuple[str, str], ...] = ()
+) -> np.ndarray:
+    """Monte Carlo clearance times (s) for a building, spread over a process pool."""
+    scenario = drill_scenario(location_name, blocked)
+    if scenario is None or occupancy <= 0:
+        return np.empty(0)
+    workers = min(runs, os.cpu_count() or 1)
+    chunks = [list(range(i, runs, workers)) for i in range(workers)]
+    # Fresh interpreters, not fork(): forking a threaded Streamlit server can deadlock the children
+    context = multiprocessing.get_context("forkserver" if sys.platform != "win32" else "spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        batches = pool.map(_simulate_drill_batch, [scenario] * workers, [occupancy] * workers, chunks)
+        return np.concatenate([np.asarray(batch) for batch in batches])
+
+
+class ExtinguisherIndex:
+    """Campus‑wide extinguisher index with walking‑distance k‑nearest queries.
+
+    Each extinguisher is attached to its nearest walkway node. A query snaps
+    the point onto the walkway graph and runs Dijkstra outwards, stopping as
+    soon as no unsettled node can beat the k‑th extinguisher found so far.
+    """
+
+    def __init__(self, locations: List[dict], path_nodes: dict):
+        rows = [
+            (loc["name"], lat, lon)
+            for loc in locations
+            for lat, lon in loc.get("extinguishers", [])
+        ]
+        self.df = pd.DataFrame(rows, columns=["building", "latitude", "longitude"])
+        self.index = SphericalKDTree(self.df["latitude"], self.df["longitude"])
+        self.node_ids = list(path_nodes)
+        coords = np.array([path_nodes[n] for n in self.node_ids], dtype=float).reshape(-1, 2)
+        self.node_index = SphericalKDTree(coords[:, 0], coords[:, 1])
+        self.at_node: dict[str, List[tuple[int, float]]] = {}
+        for ext, row in enumerate(self.df.itertuples()):
+            node, offset_km = self.node_index.query(row.latitude, row.longitude, 1)
+            if len(node):
+                self.at_node.setdefault(self.node_ids[node[0]], []).append((ext, offset_km[0] * 1000))
+
+    def nearest_straight(self, lat: float, lon: float, k: int) -> pd.DataFrame:
+        idx, km = self.index.query(lat, lon, k)
+        found = self.df.iloc[idx].copy()
+        found["walk_m"] = None  # unknown without a walkway route
+        found["straight_m"] = np.round(km * 1000).astype(int)
+        return found
+
+    def nearest_walking(self, lat: float, lon: float, k: int, router: EvacuationRouter) -> pd.DataFrame:
+        """k nearest extinguishers by walking distance over open walkways."""
+        if not len(self.node_ids) or not self.at_node:
+            return self.nearest_straight(lat, lon, k)
+        node, offset_km = self.node_index.query(lat, lon, 1)
+        start = self.node_ids[node[0]]
+        walked = {start: offset_km[0] * 1000}
+        frontier = [(walked[start], start)]
+        best: List[tuple[float, int]] = []  # max‑heap of (−metres, extinguisher)
+        while frontier:
+            metres, u = heapq.heappop(frontier)
+            if metres > walked[u]:
+                continue
+            if len(best) == k and metres >= -best[0][0]:
+                break  # every remaining extinguisher is at least this far
+            for ext, offset in self.at_node.get(u, []):
+                heapq.heappush(best, (-(metres + offset), ext))
+                if len(best) > k:
+                    heapq.heappop(best)
+            for v, seconds in router.adj[u].items():
+                cost = metres + seconds * WALKING_SPEED_MPS
+                if cost < walked.get(v, np.inf):
+                    walked[v] = cost
+                    heapq.heappush(frontier, (cost, v))
+        if not best:
+            return self.nearest_straight(lat, lon, k)  # walkway graph unreachable from here
+        best.sort(reverse=True)
+        found = self.df.iloc[[e for _, e in best]].copy()
+        found["walk_m"] = [int(round(-m)) for m, _ in best]
+        found["straight_m"] = np.rint(
+            1000 * equirectangular_km(lat, lon, found["latitude"], found["longitude"])
+        ).astype(int)
+        return found
+
+
+@st.cache_resource(show_spinner=False)
+def extinguisher_index() -> ExtinguisherIndex:
+    return ExtinguisherIndex(CAMPUS_LOCATIONS, CAMPUS_PATH_NODES)
+
+
+def nearest_extinguishers(lat: float, lon: float, k: int = EXTINGUISHER_RESULTS) -> pd.DataFrame:
+    """Closest extinguishers from any building by walking distance (blocked corridors avoided)."""
+    return extinguisher_index().nearest_walking(lat, lon, k, evacuation_router())
+
+
+class BuildingLocator:
+    """Point‑in‑polygon service over building footprints.
+
+    Footprints are bulk‑loaded into an STR (sort‑tile‑recursive) R‑tree.
+    Queries push (point, node) pairs down the tree level by level and finish
+    with a vectorised ray‑casting test, so one call classifies any number of
+    points.
+    """
+
+    NODE_CAPACITY = 8
+
+    def __init__(self, locations: List[dict], floor_levels: dict[str, List[int]] | None = None):
+        self.floor_levels = floor_levels or {}  # building name -> modelled floor levels
+        self.locations = [loc for loc in locations if len(loc.get("footprint", [])) >= 3]
+        rings = [np.asarray(loc["footprint"], dtype=float) for loc in self.locations]
+        # Pad rings to equal length by repeating the last vertex (a zero‑length edge)
+        width = max((len(ring) for ring in rings), default=3)
+        self.rings = np.array(
+            [np.vstack((ring, np.repeat(ring[-1:], width - len(ring), axis=0))) for ring in rings]
+        ).reshape(-1, width, 2)
+        boxes = np.column_stack(
+            (self.rings.min(axis=1), self.rings.max(axis=1))
+        ).reshape(-1, 4)  # lat_min, lon_min, lat_max, lon_max
+        order = self._str_order(boxes)
+        self.rings = self.rings[order]
+        self.locations = [self.locations[i] for i in order]
+        boxes = boxes[order]
+        # Pack bottom‑up; each level stores node boxes and [start, end) child ranges
+        levels: List[tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        while True:
+            starts = np.arange(0, len(boxes), self.NODE_CAPACITY)
+            ends = np.minimum(starts + self.NODE_CAPACITY, len(boxes))
+            parents = np.array(
+                [
+                    np.concatenate((boxes[a:b, :2].min(axis=0), boxes[a:b, 2:].max(axis=0)))
+                    for a, b in zip(starts, ends)
+                ]
+            ).reshape(-1, 4)
+            if len(parents) > 1:
+                order = self._str_order(parents)
+                parents, starts, ends = parents[order], starts[order], ends[order]
+            levels.append((parents, starts, ends))
+            if len(parents) <= 1:
+                break
+            boxes = parents
+        self.levels = levels[::-1]  # root first
+
+    def _str_order(self, boxes: np.ndarray) -> np.ndarray:
+        """Sort‑tile‑recursive packing order: slice by longitude, then sort by latitude."""
+        n = len(boxes)
+        if n == 0:
+            return np.arange(0)
+        centres = (boxes[:, :2] + boxes[:, 2:]) / 2
+        n_slices = int(np.ceil(np.sqrt(np.ceil(n / self.NODE_CAPACITY))))
+        by_lon = np.argsort(centres[:, 1], kind="stable")
+        per_slice = n_slices * self.NODE_CAPACITY
+        return np.concatenate(
+            [
+                chunk[np.argsort(centres[chunk, 0], kind="stable")]
+                for chunk in np.array_split(by_lon, np.arange(per_slice, n, per_slice))
+            ]
+        )
+
+    def classify(self, lats, lons) -> np.ndarray:
+        """Index into ``self.locations`` of the footprint containing each point (−1 if none)."""
+        lat = np.atleast_1d(np.asarray(lats, dtype=float))
+        lon = np.atleast_1d(np.asarray(lons, dtype=float))
+        result = np.full(len(lat), -1, dtype=np.int64)
+        if not self.locations:
+            return result
+        pts = np.arange(len(lat))
+        nodes = np.zeros(len(lat), dtype=np.int64)
+        for boxes, starts, ends in self.levels:
+            box = boxes[nodes]
+            keep = (
+                (box[:, 0] <= lat[pts]) & (lat[pts] <= box[:, 2])
+                & (box[:, 1] <= lon[pts]) & (lon[pts] <= box[:, 3])
+            )
+            pts, nodes = pts[keep], nodes[keep]
+            fan_out = ends[nodes] - starts[nodes]
+            pts = np.repeat(pts, fan_out)
+            nodes = np.repeat(starts[nodes] - np.cumsum(fan_out) + fan_out, fan_out) + np.arange(len(pts))
+        # Even‑odd ray casting along +longitude for every (point, candidate ring) pair
+        ring = self.rings[nodes]
+        nxt = np.roll(ring, -1, axis=1)
+        y, x = lat[pts, None], lon[pts, None]
+        straddles = (ring[:, :, 0] > y) != (nxt[:, :, 0] > y)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_cross = ring[:, :, 1] + (y - ring[:, :, 0]) * (nxt[:, :, 1] - ring[:, :, 1]) / (
+                nxt[:, :, 0] - ring[:, :, 0]
+            )
+        inside = (straddles & (x < x_cross)).sum(axis=1) % 2 == 1
+        result[pts[inside]] = nodes[inside]
+        return result
+
+    def locate(self, lat: float, lon: float, altitude_m: float | None = None) -> tuple[dict | None, int | None]:
+        """Building containing a GPS fix and, given an altitude, the nearest modelled floor level."""
+        hit = self.classify(lat, lon)[0]
+        if hit < 0:
+            return None, None
+        loc = self.locations[hit]
+        levels = self.floor_levels.get(loc["name"])
+        floor = None
+        if altitude_m is not None and levels:
+            storey = (altitude_m - CAMPUS_GROUND_ALT_M) / FLOOR_HEIGHT_M
+            floor = min(levels, key=lambda level: abs(level - storey))
+        return loc, floor
+
+
+@st.cache_resource(show_spinner=False)
+def building_locator() -> BuildingLocator:
+    tree = location_tree()
+    return BuildingLocator(CAMPUS_LOCATIONS, {name: tree.floor_levels(name) for name in tree.building_names})
+
+
+class LocationTree:
+    """Campus hierarchy (building → floor → room) indexed by node id.
+
+    Buildings come from ``CAMPUS_LOCATIONS``; floors and rooms from the
+    optional ``CAMPUS_HIERARCHY_PATH`` file, matched to buildings by name.
+    """
+
+    def __init__(self, locations: List[dict], hierarchy: dict):
+        self.nodes: dict[str, dict] = {}
+        self.locations = {loc["name"]: loc for loc in locations}
+        self.building_names = list(self.locations)
+        self.building_ids: dict[str, str] = {}
+        specs = {b["name"]: b for b in hierarchy.get("buildings", [])}
+        for loc in locations:
+            spec = specs.get(loc["name"], {})
+            building_id = spec.get("id", loc["name"])
+            self.building_ids[loc["name"]] = building_id
+            self._add(building_id, loc["name"], "building", None, loc["latitude"], loc["longitude"], 0)
+            for floor in sorted(spec.get("floors", []), key=lambda f: f.get("level", 0)):
+                level = floor.get("level", 0)
+                node = self._add(
+                    floor["id"], floor["name"], "floor", building_id, loc["latitude"], loc["longitude"], level
+                )
+                node["stairs"] = [tuple(p) for p in floor.get("stairs", [])]
+                for room in floor.get("rooms", []):
+                    self._add(room["id"], room["name"], "room", floor["id"], room["latitude"], room["longitude"], level)
+
+    def _add(self, node_id: str, name: str, kind: str, parent: str | None, lat: float, lon: float, level: int) -> dict:
+        node = {
+            "id": node_id,
+            "name": name,
+            "kind": kind,
+            "parent": parent,
+            "children": [],
+            "latitude": lat,
+            "longitude": lon,
+            "level": level,
+        }
+        self.nodes[node_id] = node
+        if parent is not None:
+            self.nodes[parent]["children"].append(node_id)
+        return node
 
+    def children(self, node_id: str) -> List[dict]:
+        return [self.nodes[child] for child in self.nodes[node_id]["children"]]
 
-def log_event(status: str, location: str, notes: str = "") -> None:
+    def floor_levels(self, building_name: str) -> List[int]:
+        """Levels of a building's modelled floors, lowest first (empty without an indoor model)."""
+        return [floor["level"] for floor in self.children(self.building_ids[building_name])]
+
+    def location_of(self, node_id: str) -> dict:
+        """The ``CAMPUS_LOCATIONS`` entry of the building that contains a node."""
+        node = self.nodes[node_id]
+        while node["parent"] is not None:
+            node = self.nodes[node["parent"]]
+        return self.locations[node["name"]]
+
+
+@st.cache_resource(show_spinner=False)
+def location_tree() -> LocationTree:
+    hierarchy = {}
+    if CAMPUS_HIERARCHY_PATH.exists():
+        hierarchy = json.loads(CAMPUS_HIERARCHY_PATH.read_text(encoding="utf-8"))
+    return LocationTree(CAMPUS_LOCATIONS, hierarchy)
+
+
+def indoor_evacuation_route(node_id: str, router: EvacuationRouter) -> dict | None:
+    """Evacuation route from a building, floor or room, taking stairs on upper floors.
+
+    Path points are ``(lat, lon, height_m)`` so they render in 3‑D.
+    """
+    tree = location_tree()
+    node = tree.nodes[node_id]
+    loc = tree.location_of(node_id)
+    if node["kind"] == "building":
+        evac = router.route_for_location(loc)
+        if evac:
+            evac["path"] = [(lat, lon, 0.0) for lat, lon in evac["path"]]
+        return evac
+
+    height = node["level"] * FLOOR_HEIGHT_M
+    path = [(node["latitude"], node["longitude"], height)]
+    seconds = 0.0
+    floor = node if node["kind"] == "floor" else tree.nodes[node["parent"]]
+    if node["level"] > 0 and floor.get("stairs"):
+        stair = min(floor["stairs"], key=lambda p: equirectangular_km(*path[0][:2], *p))
+        seconds += 1000 * equirectangular_km(*path[0][:2], *stair) / WALKING_SPEED_MPS
+        seconds += height / STAIR_DESCENT_MPS
+        path += [(*stair, height), (*stair, 0.0)]
+
+    here = path[-1][:2]
+    exits = [e for e in loc.get("exits", []) if np.isfinite(router.seconds.get(e, np.inf))]
+    if not exits:
+        return None
+    walk = {e: 1000 * equirectangular_km(*here, *router.nodes[e]) / WALKING_SPEED_MPS for e in exits}
+    exit_node = min(exits, key=lambda e: walk[e] + router.seconds[e])
+    nodes = router.route_from_node(exit_node)
+    return {
+        "path": path + [(*router.nodes[n], 0.0) for n in nodes],
+        "seconds": seconds + walk[exit_node] + router.seconds[exit_node],
+        "exit": exit_node,
+        "assembly": router.assembly_points[nodes[-1]],
+    }
+
+
+def normalise_name(text: str) -> str:
+    """Lower‑case words with punctuation folded to single spaces, for name matching."""
+    return " ".join("".join(ch if ch.isalnum() else " " for ch in text.lower()).split())
+
+
+class PlaceSearch:
+    """Typo‑tolerant type‑ahead search over campus places and fire stations.
+
+    Names are split into padded character trigrams with one posting array
+    per trigram; a query scores every name by trigram overlap (Dice
+    coefficient) in a single ``bincount``, with a bonus for prefix matches
+    found by bisecting the sorted word‑start suffixes of all names.
+    """
+
+    def __init__(self, entries: List[tuple[str, str, str]]):
+        # entries: (kind, key, label); key is a tree node id or a station row label
+        self.kinds = [kind for kind, _, _ in entries]
+        self.keys = [key for _, key, _ in entries]
+        self.labels = [label for _, _, label in entries]
+        self._norm = [normalise_name(label) for label in self.labels]
+        postings: dict[str, List[int]] = {}
+        sizes = []
+        for i, text in enumerate(self._norm):
+            grams = self._trigrams(text)
+            sizes.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        self._postings = {gram: np.asarray(ids, dtype=np.int32) for gram, ids in postings.items()}
+        self._sizes = np.asarray(sizes, dtype=np.float64)
+        self._kinds = np.asarray(self.kinds)
+        # Name from each word start on ("kengeri fire station", "fire station", …), sorted
+        suffixes = sorted(
+            (text[start:], i)
+            for i, text in enumerate(self._norm)
+            for start in [0, *(j + 1 for j, ch in enumerate(text) if ch == " ")]
+        )
+        self._suffixes = [suffix for suffix, _ in suffixes]
+        self._suffix_owner = np.asarray([i for _, i in suffixes], dtype=np.int32)
+
+    @staticmethod
+    def _trigrams(text: str) -> set[str]:
+        padded = f"  {text} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def search(self, query: str, limit: int = 10, kinds: set[str] | None = None) -> List[dict]:
+        """Best matches as ``{"kind", "key", "label", "score"}``, highest score first."""
+        text = normalise_name(query)
+        if not text or not self.labels:
+            return []
+        grams = self._trigrams(text)
+        hits = [self._postings[g] for g in grams if g in self._postings]
+        if not hits:
+            return []
+        common = np.bincount(np.concatenate(hits), minlength=len(self.labels))
+        scores = 2.0 * common / (len(grams) + self._sizes)
+        # Prefix of the name or of any word in it ranks above fuzzy matches; the
+        # matching suffixes are one contiguous range (a repeated owner adds once)
+        lo = bisect.bisect_left(self._suffixes, text)
+        hi = bisect.bisect_left(self._suffixes, text + "\uffff")
+        scores[self._suffix_owner[lo:hi]] += 1.0
+        keep = scores >= PLACE_SEARCH_MIN_SCORE
+        if kinds is not None:
+            keep &= np.isin(self._kinds, list(kinds))
+        candidates = np.flatnonzero(keep)
+        if len(candidates) > limit > 0:
+            # Everything tied with the limit‑th best stays in, so ties break by position
+            kth = -np.partition(-scores[candidates], limit - 1)[limit - 1]
+            candidates = candidates[scores[candidates] >= kth]
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))][:limit]
+        return [
+            {"kind": self.kinds[i], "key": self.keys[i], "label": self.labels[i], "score": float(scores[i])}
+            for i in candidates
+        ]
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _place_search(stations_version: str) -> PlaceSearch:
+    tree = location_tree()
+    entries = []
+    for node in tree.nodes.values():
+        label = node["name"]
+        if node["kind"] != "building":
+            label = f"{node['name']} – {tree.location_of(node['id'])['name']}"
+        entries.append((node["kind"], node["id"], label))
+    stations = station_registry().df
+    entries += [("station", label, name) for label, name in stations["name"].items()]
+    return PlaceSearch(entries)
+
+
+def place_search() -> PlaceSearch:
+    """Process‑wide search index, rebuilt only when the station registry changes."""
+    return _place_search(station_registry().version)
+
+
+class Gazetteer:
+    """Offline geocoder over a local gazetteer of named places.
+
+    Two indexes answer autocomplete, each a key → places map with its keys
+    sorted for prefix search by bisection: one keyed on full names and
+    aliases, one on their words, so words can be typed in any order and
+    abbreviated.
+    """
+
+    KIND_LABELS = {"village": "village", "town": "town", "landmark": "landmark", "railway_station": "railway station"}
+
+    def __init__(self, places: List[dict]):
+        self.places = places
+        self._name_places: dict[str, set[int]] = {}
+        self._token_places: dict[str, set[int]] = {}
+        for i, place in enumerate(places):
+            for name in [place["name"], *place["aliases"]]:
+                norm = normalise_name(name)
+                self._name_places.setdefault(norm, set()).add(i)
+                for token in norm.split():
+                    self._token_places.setdefault(token, set()).add(i)
+        self._names = sorted(self._name_places)
+        self._tokens = sorted(self._token_places)
+
+    @classmethod
+    def from_csv(cls, path: Path) -> "Gazetteer":
+        places = []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                try:
+                    lat, lon = float(row["latitude"]), float(row["longitude"])
+                except (TypeError, ValueError):
+                    continue  # skip rows without usable coordinates
+                places.append({
+                    "name": row["name"].strip(),
+                    "kind": (row.get("kind") or "landmark").strip(),
+                    "latitude": lat,
+                    "longitude": lon,
+                    "aliases": [a.strip() for a in (row.get("aliases") or "").split(";") if a.strip()],
+                })
+        return cls(places)
+
+    @staticmethod
+    def _prefixed(keys: List[str], index: dict[str, set[int]], prefix: str) -> set[int]:
+        """Places under every key of the sorted ``keys`` that starts with ``prefix``."""
+        found: set[int] = set()
+        for key in keys[bisect.bisect_left(keys, prefix):]:
+            if not key.startswith(prefix):
+                break
+            found |= index[key]
+        return found
+
+    def autocomplete(self, text: str, limit: int = GAZETTEER_RESULTS) -> List[dict]:
+        """Places whose name or alias starts with ``text``, then places matching all its words.
+
+        Every word may be a prefix, so "rail keng" finds Kengeri Railway Station.
+        """
+        query = normalise_name(text)
+        if not query:
+            return []
+        def by_length(i: int) -> tuple[int, str]:
+            return len(self.places[i]["name"]), self.places[i]["name"]
+
+        ranked = sorted(self._prefixed(self._names, self._name_places, query), key=by_length)
+        words = [self._prefixed(self._tokens, self._token_places, word) for word in query.split()]
+        ranked += sorted(set.intersection(*words) - set(ranked), key=by_length)
+        return [self.places[i] for i in ranked[:limit]]
+
+    def geocode(self, text: str) -> tuple[float, float] | None:
+        """Coordinates of the best match for ``text``, or ``None``."""
+        hits = self.autocomplete(text, limit=1)
+        return (hits[0]["latitude"], hits[0]["longitude"]) if hits else None
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _load_gazetteer(mtime_ns: int) -> Gazetteer:
+    if mtime_ns < 0:
+        return Gazetteer([])
+    return Gazetteer.from_csv(GAZETTEER_CSV)
+
+
+def gazetteer() -> Gazetteer:
+    """Process‑wide gazetteer; re‑read only when the file changes on disk."""
+    try:
+        return _load_gazetteer(GAZETTEER_CSV.stat().st_mtime_ns)
+    except FileNotFoundError:
+        return _load_gazetteer(-1)
+
+
+class AppendOnlyLogWriter:
+    """Appends one CSV row per event and never rewrites existing history.
+
+    A row torn by a crash is closed off with a newline before the next append,
+    so at worst that single row is lost; earlier rows are never touched.
+    """
+
+    def __init__(self, path: Path, columns: List[str], fsync_policy: str, fsync_interval_s: float):
+        if fsync_policy not in {"always", "interval", "never"}:
+            raise ValueError(f"Unknown log fsync policy: {fsync_policy!r}")
+        self.path = path
+        self.columns = columns
+        self.fsync_policy = fsync_policy
+        self.fsync_interval_s = fsync_interval_s
+        self._lock = threading.Lock()
+        self._last_fsync = 0.0
+
+    def _encode(self, row: List) -> bytes:
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator="\n").writerow(row)
+        return buf.getvalue().encode("utf-8")
+
+    def append(self, entry: dict) -> None:
+        data = self._encode([entry.get(col, "") for col in self.columns])
+        with self._lock, self.path.open("a+b") as fh:
+            size = fh.seek(0, os.SEEK_END)
+            if size == 0:
+                data = self._encode(self.columns) + data
+            else:
+                fh.seek(size - 1)
+                if fh.read(1) != b"\n":
+                    data = b"\n" + data
+            fh.write(data)
+            fh.flush()
+            self._maybe_fsync(fh, created=size == 0)
+
+    def _maybe_fsync(self, fh, created: bool) -> None:
+        now = time.monotonic()
+        if self.fsync_policy == "never":
+            return
+        if self.fsync_policy == "interval" and now - self._last_fsync < self.fsync_interval_s:
+            return
+        os.fsync(fh.fileno())
+        self._last_fsync = now
+        if created:
+            # Make the new directory entry durable as well
+            dir_fd = os.open(self.path.parent, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+
+@st.cache_resource(show_spinner=False)
+def incident_log_writer() -> AppendOnlyLogWriter:
+    """One writer (and lock) per process, shared by every session."""
+    return AppendOnlyLogWriter(LOG_FILE, LOG_COLUMNS, LOG_FSYNC_POLICY, LOG_FSYNC_INTERVAL_S)
+
+
+def read_log_csv(path: Path = LOG_FILE) -> List[dict]:
+    """Read the CSV mirror, skipping a row torn by a crash mid‑append."""
+    if not path.exists():
+        return []
+    with path.open(newline="", encoding="utf-8") as fh:
+        reader = csv.reader(fh)
+        header = next(reader, LOG_COLUMNS)
+        return [dict(zip(header, row)) for row in reader if len(row) == len(header)]
+
+
+class IncidentStore:
+    """SQLite (WAL) incident table safe for concurrent sessions and processes."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS incidents (
+            id        INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            status    TEXT NOT NULL,
+            location  TEXT NOT NULL,
+            notes     TEXT NOT NULL DEFAULT '',
+            latitude  REAL,
+            longitude REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_incidents_timestamp ON incidents (timestamp);
+        CREATE INDEX IF NOT EXISTS idx_incidents_status ON incidents (status, timestamp);
+        CREATE INDEX IF NOT EXISTS idx_incidents_location ON incidents (location, timestamp);
+    """
+    COLUMNS = ["id", "timestamp", "status", "location", "notes", "latitude", "longitude"]
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+        self._import_legacy_csv(conn)
+
+    def _conn(self) -> sqlite3.Connection:
+        # Streamlit runs each session on its own thread; sqlite3 connections are per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _import_legacy_csv(self, conn: sqlite3.Connection) -> None:
+        """Seed an empty database from the CSV log used by earlier versions."""
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM incidents LIMIT 1").fetchone():
+                return
+            conn.executemany(
+                "INSERT INTO incidents (timestamp, status, location, notes) VALUES (?, ?, ?, ?)",
+                [
+                    (row["timestamp"], row["status"], row["location"], row.get("notes", ""))
+                    for row in read_log_csv()
+                ],
+            )
+
+    def add(self, entry: dict) -> int:
+        conn = self._conn()
+        with conn:
+            cur = conn.execute(
+                "INSERT INTO incidents (timestamp, status, location, notes, latitude, longitude) "
+                "VALUES (:timestamp, :status, :location, :notes, :latitude, :longitude)",
+                {"latitude": None, "longitude": None, **entry},
+            )
+        return cur.lastrowid
+
+    @staticmethod
+    def _where(start: str | None, end: str | None, status: str | None, location: str | None):
+        clauses, params = [], []
+        if start:
+            clauses.append("timestamp >= ?")
+            params.append(start)
+        if end:
+            clauses.append("timestamp < ?")
+            params.append(end)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if location:
+            clauses.append("location = ?")
+            params.append(location)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(
+        self,
+        start: str | None = None,
+        end: str | None = None,
+        status: str | None = None,
+        location: str | None = None,
+        limit: int | None = None,
+        before: tuple[str, int] | None = None,
+    ) -> pd.DataFrame:
+        """Filtered incidents, newest first; ``end`` is exclusive.
+
+        ``before`` is the ``(timestamp, id)`` of the last row already shown:
+        the page continues from there with an index range scan, so deep pages
+        cost the same as the first (no OFFSET).
+        """
+        where, params = self._where(start, end, status, location)
+        if before is not None:
+            where += (" AND " if where else " WHERE ") + "(timestamp, id) < (?, ?)"
+            params += list(before)
+        sql = f"SELECT {', '.join(self.COLUMNS)} FROM incidents{where} ORDER BY timestamp DESC, id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return pd.read_sql_query(sql, self._conn(), params=params)
+
+    def distinct(self, column: str) -> List[str]:
+        """Distinct values of an indexed filter column (``status`` or ``location``)."""
+        if column not in {"status", "location"}:
+            raise ValueError(f"Not a filterable column: {column!r}")
+        rows = self._conn().execute(f"SELECT DISTINCT {column} FROM incidents ORDER BY {column}")
+        return [value for (value,) in rows]
+
+    def rows_after(self, last_id: int) -> List[tuple]:
+        """Rows with ``id > last_id`` in id order – a primary‑key range scan."""
+        return self._conn().execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM incidents WHERE id > ? ORDER BY id",
+            (last_id,),
+        ).fetchall()
+
+
+@st.cache_resource(show_spinner=False)
+def incident_store() -> IncidentStore:
+    return IncidentStore(INCIDENT_DB)
+
+
+class IncidentLogCache:
+    """In‑memory copy of the incident table shared by every session of a process.
+
+    New events are picked up by tailing row ids past the last one seen, so a
+    refresh costs O(new rows) and memory does not grow with open sessions.
+    """
+
+    def __init__(self, store: IncidentStore):
+        self.store = store
+        self.rows: List[tuple] = []
+        self.last_id = 0
+        self._lock = threading.Lock()
+
+    def refresh(self) -> int:
+        """Pull rows logged since the last refresh (by any process); returns how many."""
+        with self._lock:
+            new_rows = self.store.rows_after(self.last_id)
+            if new_rows:
+                self.rows.extend(new_rows)
+                self.last_id = new_rows[-1][0]
+            return len(new_rows)
+
+    def recent(self, n: int) -> pd.DataFrame:
+        """The ``n`` most recently logged incidents, newest first."""
+        self.refresh()
+        recent_df = pd.DataFrame(self.rows[-n:], columns=IncidentStore.COLUMNS)
+        return recent_df.sort_values(["timestamp", "id"], ascending=False)
+
+
+@st.cache_resource(show_spinner=False)
+def incident_log_cache() -> IncidentLogCache:
+    return IncidentLogCache(incident_store())
+
+
+def log_event(
+    status: str,
+    location: str,
+    notes: str = "",
+    latitude: float | None = None,
+    longitude: float | None = None,
+) -> None:
     ts = datetime.now().isoformat(timespec="seconds")
     entry = {
         "timestamp": ts,
         "status": status,
         "location": location,
         "notes": notes,
+        "latitude": latitude,
+        "longitude": longitude,
     }
-    if "log" not in st.session_state:
-        st.session_state.log: List[dict] = []
-    st.session_state.log.append(entry)
-    # Persist to CSV
-    pd.DataFrame(st.session_state.log).to_csv(LOG_FILE, index=False)
+    incident_store().add(entry)
+    # Human‑readable mirror: append a single row, O(1) regardless of history size
+    incident_log_writer().append(entry)
 
 
-def load_existing_log() -> None:
-    if LOG_FILE.exists() and "log" not in st.session_state:
-        st.session_state.log = pd.read_csv(LOG_FILE).to_dict("records")
+class LayoutVariants:
+    """Downscaled WebP copies of the site layout, generated once per source image.
 
+    Files are named by the source's content hash, so a changed layout gets
+    new URLs and browsers may cache every variant indefinitely.
+    """
 
-def draw_map(selected_loc: dict | None, highlight_evac: bool = False):
-    """Render a pydeck map with campus, fire stations, and optional overlays."""
-    stations_df = load_fire_station_df()
+    def __init__(self, source: Path):
+        self.version = _file_sha1(source)[:12]
+        self.data: dict[str, bytes] = {}  # file name -> WebP bytes
+        self.widths: dict[int, str] = {}  # pixel width -> file name
+        with Image.open(source) as img:
+            img = img.convert("RGBA")
+            for width in sorted({min(w, img.width) for w in SITE_LAYOUT_WIDTHS}):
+                name = f"{self.version}-{width}.webp"
+                path = SITE_LAYOUT_VARIANT_DIR / name
+                try:
+                    data = path.read_bytes()
+                except OSError:
+                    buf = io.BytesIO()
+                    resized = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+                    resized.save(buf, "WEBP", quality=SITE_LAYOUT_WEBP_QUALITY)
+                    data = buf.getvalue()
+                    self._write(path, data)
+                self.widths[width] = name
+                self.data[name] = data
 
-    layers = []
-
-    # Fire stations layer
-    layers.append(
-        pdk.Layer(
-            "ScatterplotLayer",
-            data=stations_df,
-            get_position="[longitude, latitude]",
-            get_radius=150,
-            get_fill_color=[255, 0, 0, 160],
-            pickable=True,
-        )
-    )
+    @staticmethod
+    def _write(path: Path, data: bytes) -> None:
+        tmp = path.with_suffix(".tmp")
+        try:
+            path.parent.mkdir(exist_ok=True)
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError:
+            if tmp.exists():
+                tmp.unlink()
+            # Read‑only deployments keep the variants in memory only
 
-    # Campus locations layer
-    loc_df = pd.DataFrame(CAMPUS_LOCATIONS)
-    layers.append(
-        pdk.Layer(
-            "ScatterplotLayer",
-            data=loc_df,
-            get_position="[longitude, latitude]",
-            get_radius=100,
-            get_fill_color=[0, 128, 255, 160],
-            pickable=True,
-        )
-    )
+    @property
+    def largest(self) -> str:
+        return self.widths[max(self.widths)]
 
-    # Extinguishers & Evac path for selected location
-    if selected_loc:
-        # Extinguishers as small green dots
-        ext_data = pd.DataFrame(
-            [
-                {"lat": lat, "lon": lon}
-                for lat, lon in selected_loc.get("extinguishers", [])
+    def pick(self, screen_px: float) -> str:
+        """Smallest variant at least ``screen_px`` wide (else the largest)."""
+        fits = [w for w in self.widths if w >= screen_px]
+        return self.widths[min(fits) if fits else max(self.widths)]
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _load_layout_variants(mtime_ns: int) -> LayoutVariants:
+    return LayoutVariants(SITE_LAYOUT_PATH)
+
+
+def layout_variants() -> LayoutVariants | None:
+    """WebP variants of the site layout, regenerated only when the image changes."""
+    try:
+        return _load_layout_variants(SITE_LAYOUT_PATH.stat().st_mtime_ns)
+    except FileNotFoundError:
+        return None
+
+
+class TileStore:
+    """Read‑only MBTiles reader with an in‑memory LRU of hot tiles.
+
+    MBTiles rows are TMS (y counted from the south); ``tile`` takes the
+    XYZ ``y`` that map clients request.
+    """
+
+    MIME_TYPES = {
+        "png": "image/png",
+        "jpg": "image/jpeg",
+        "jpeg": "image/jpeg",
+        "webp": "image/webp",
+        "pbf": "application/x-protobuf",
+    }
+
+    def __init__(self, path: Path, cache_size: int = TILE_CACHE_SIZE):
+        self.path = path
+        self.cache_size = cache_size
+        self._local = threading.local()
+        self._cache: OrderedDict[tuple[int, int, int], bytes | None] = OrderedDict()
+        self._lock = threading.Lock()
+        self.metadata = dict(self._conn().execute("SELECT name, value FROM metadata").fetchall())
+        self.format = self.metadata.get("format", "png").lower()
+        self.mime_type = self.MIME_TYPES.get(self.format, "application/octet-stream")
+        # Tiles never change while the file doesn't, so its mtime versions every tile
+        self.etag_base = f"{path.stat().st_mtime_ns:x}"
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro", uri=True)
+            self._local.conn = conn
+        return conn
+
+    def tile(self, z: int, x: int, y: int) -> bytes | None:
+        key = (z, x, y)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        row = self._conn().execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (z, x, (1 << z) - 1 - y),
+        ).fetchone()
+        data = row[0] if row else None
+        with self._lock:
+            self._cache[key] = data  # misses are cached too: ocean / outside coverage
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return data
+
+    def style(self, base_url: str) -> dict:
+        """MapLibre style for the tiles: the file's own style if shipped, else a plain one."""
+        source = {
+            "tiles": [f"{base_url}/tiles/{{z}}/{{x}}/{{y}}.{self.format}"],
+            "minzoom": int(self.metadata.get("minzoom", 0)),
+            "maxzoom": int(self.metadata.get("maxzoom", 14)),
+            "attribution": self.metadata.get("attribution", ""),
+        }
+        if MBTILES_STYLE.exists():
+            style = json.loads(MBTILES_STYLE.read_text(encoding="utf-8"))
+            for spec in style.get("sources", {}).values():
+                if spec.get("url") == "mbtiles://basemap":
+                    spec.pop("url")
+                    spec.update(source)
+            return style
+        if self.format != "pbf":
+            return {
+                "version": 8,
+                "sources": {"basemap": {"type": "raster", "tileSize": 256, **source}},
+                "layers": [{"id": "basemap", "type": "raster", "source": "basemap"}],
+            }
+        # Vector tiles without a style: outline every source layer in grey
+        vector_layers = json.loads(self.metadata.get("json", "{}")).get("vector_layers", [])
+        return {
+            "version": 8,
+            "sources": {"basemap": {"type": "vector", **source}},
+            "layers": [{"id": "background", "type": "background", "paint": {"background-color": "#f2efe9"}}]
+            + [
+                {
+                    "id": layer["id"],
+                    "type": "line",
+                    "source": "basemap",
+                    "source-layer": layer["id"],
+                    "paint": {"line-color": "#9a9a9a", "line-width": 1},
+                }
+                for layer in vector_layers
+            ],
+        }
+
+
+class _TileRequestHandler(BaseHTTPRequestHandler):
+    map_server: LocalMapServer
+
+    def do_GET(self) -> None:
+        parts = self.path.split("?", 1)[0].strip("/").split("/")
+        store, layout = self.map_server.store, self.map_server.layout
+        if len(parts) == 2 and parts[0] == "layout" and layout and parts[1] in layout.data:
+            # Content‑addressed names never change meaning: cache without revalidation
+            self._send(200, layout.data[parts[1]], "image/webp", etag=f'"{parts[1]}"', immutable=True)
+        elif store is None:
+            self._send(404, b"not found", "text/plain")
+        elif parts == ["style.json"]:
+            # Point the tiles at the address this browser used to reach us
+            base_url = TILE_SERVER_URL or f"http://{self.headers.get('Host') or self.map_server.host}"
+            body = json.dumps(store.style(base_url)).encode()
+            self._send(200, body, "application/json", etag=f'"style-{store.etag_base}"')
+        elif len(parts) == 4 and parts[0] == "tiles":
+            try:
+                z, x, y = int(parts[1]), int(parts[2]), int(parts[3].split(".", 1)[0])
+            except ValueError:
+                self._send(400, b"bad tile address", "text/plain")
+                return
+            data = store.tile(z, x, y)
+            if data is None:
+                self._send(204 if store.format == "pbf" else 404, b"", store.mime_type)
+            else:
+                self._send(200, data, store.mime_type, etag=f'"{store.etag_base}-{z}-{x}-{y}"')
+        else:
+            self._send(404, b"not found", "text/plain")
+
+    def _send(
+        self, status: int, body: bytes, content_type: str, etag: str | None = None, immutable: bool = False
+    ) -> None:
+        if etag and self.headers.get("If-None-Match") == etag:
+            status, body = 304, b""
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        if etag:
+            self.send_header(
+                "Cache-Control",
+                "public, max-age=31536000, immutable" if immutable else f"public, max-age={TILE_MAX_AGE_S}",
+            )
+            self.send_header("ETag", etag)
+        if body[:2] == b"\x1f\x8b":
+            self.send_header("Content-Encoding", "gzip")  # vector tiles are usually stored gzipped
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass  # one line per tile would drown the app's own log
+
+
+class LocalMapServer:
+    """Daemon HTTP server for offline base‑map tiles and the site‑layout variants.
+
+    ``store`` and ``layout`` are swapped in by the app when their files
+    change; requests always read the current ones. It listens on the same
+    interface as Streamlit unless ``IRIDM_TILE_HOST`` says otherwise.
+    """
+
+    def __init__(self):
+        self.store: TileStore | None = None
+        self.layout: LayoutVariants | None = None
+        self.host = TILE_SERVER_HOST or st.get_option("server.address") or "0.0.0.0"
+        self.port: int | None = None
+        handler = type("TileRequestHandler", (_TileRequestHandler,), {"map_server": self})
+        try:
+            try:
+                server = ThreadingHTTPServer((self.host, TILE_SERVER_PORT), handler)
+            except OSError:
+                server = ThreadingHTTPServer((self.host, 0), handler)  # port taken
+        except OSError:
+            return  # cannot listen here at all; the map stays on its online defaults
+        server.daemon_threads = True
+        self.port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def url_for(self, page_url: str | None) -> str | None:
+        """Base URL a browser showing ``page_url`` can reach the server at, or None.
+
+        The server speaks plain HTTP on its own port, so without an
+        ``IRIDM_TILE_URL`` it is unusable from HTTPS pages (mixed content) and,
+        when bound to loopback, from any browser on another machine.
+        """
+        if TILE_SERVER_URL:
+            return TILE_SERVER_URL.rstrip("/")
+        page = urlsplit(page_url or "")
+        if self.port is None or page.scheme != "http" or not page.hostname:
+            return None
+        if _is_loopback(self.host) and not _is_loopback(page.hostname):
+            return None
+        host = f"[{page.hostname}]" if ":" in page.hostname else page.hostname
+        return f"http://{host}:{self.port}"
+
+
+def local_map_url(store: TileStore | None, layout: LayoutVariants | None) -> str | None:
+    """Hand the current files to the local map server; its URL for this session's browser.
+
+    None when there is nothing to serve or the browser cannot reach the server.
+    """
+    if not (store or layout):
+        return None
+    server = local_map_server()
+    server.store, server.layout = store, layout
+    return server.url_for(st.context.url)
+
+
+def _is_loopback(host: str) -> bool:
+    try:
+        return host == "localhost" or ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+@st.cache_resource(show_spinner=False)
+def local_map_server() -> LocalMapServer:
+    return LocalMapServer()
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _load_tile_store(mtime_ns: int) -> TileStore:
+    return TileStore(MBTILES_PATH)
+
+
+def tile_store() -> TileStore | None:
+    """Reader for the offline base map, reopened only when the MBTiles file changes."""
+    try:
+        return _load_tile_store(MBTILES_PATH.stat().st_mtime_ns)
+    except FileNotFoundError:
+        return None
+
+
+def mercator_xy(lats, lons) -> tuple[np.ndarray, np.ndarray]:
+    """Web‑Mercator world coordinates in ``[0, 1]`` (x east, y south)."""
+    x = (np.asarray(lons, dtype=float) + 180.0) / 360.0
+    sin = np.clip(np.sin(np.radians(np.asarray(lats, dtype=float))), -0.9999, 0.9999)
+    y = 0.5 - np.log((1 + sin) / (1 - sin)) / (4 * np.pi)
+    return x, y
+
+
+def mercator_latlon(x, y) -> tuple[np.ndarray, np.ndarray]:
+    lons = np.asarray(x, dtype=float) * 360.0 - 180.0
+    lats = np.degrees(2 * np.arctan(np.exp((0.5 - np.asarray(y, dtype=float)) * 2 * np.pi)) - np.pi / 2)
+    return lats, lons
+
+
+class ClusterIndex:
+    """Supercluster‑style hierarchical point clustering, precomputed per zoom level.
+
+    Level ``CLUSTER_MAX_ZOOM + 1`` holds the raw points; each lower zoom
+    greedily merges the level above within ``CLUSTER_RADIUS_PX`` screen
+    pixels (a grid of radius‑sized cells limits the neighbour search),
+    placing clusters at the count‑weighted centroid. A view ships the whole
+    level of its zoom when that is small (coarse zooms), else only the
+    clusters inside its extent.
+    """
+
+    def __init__(self, lats, lons):
+        x, y = mercator_xy(lats, lons)
+        count = np.ones(len(x), dtype=np.int64)
+        self.levels = {CLUSTER_MAX_ZOOM + 1: (x, y, count)}
+        for zoom in range(CLUSTER_MAX_ZOOM, MAP_MIN_ZOOM - 1, -1):
+            x, y, count = self._merge(x, y, count, CLUSTER_RADIUS_PX / (MAP_TILE_PX * 2 ** zoom))
+            self.levels[zoom] = (x, y, count)
+
+    @staticmethod
+    def _merge(x: np.ndarray, y: np.ndarray, count: np.ndarray, radius: float):
+        cx = np.floor(x / radius).astype(np.int64)
+        cy = np.floor(y / radius).astype(np.int64)
+        # Points alone in their 3×3 cell block cannot merge; pass them through
+        # in bulk and run the greedy merge only over the crowded ones
+        key = cx * 2 ** 32 + cy
+        keys, per_cell = np.unique(key, return_counts=True)
+        neighbours = np.zeros(len(x), dtype=np.int64)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                probe = key + dx * 2 ** 32 + dy
+                pos = np.minimum(np.searchsorted(keys, probe), len(keys) - 1)
+                neighbours += np.where(keys[pos] == probe, per_cell[pos], 0)
+        alone = neighbours == 1
+        out_x, out_y, out_count = x[alone].tolist(), y[alone].tolist(), count[alone].tolist()
+
+        cells: dict[tuple[int, int], List[int]] = {}
+        crowded = np.flatnonzero(~alone)
+        for i in crowded.tolist():
+            cells.setdefault((cx[i], cy[i]), []).append(i)
+        taken = alone.copy()
+        for i in crowded.tolist():
+            if taken[i]:
+                continue
+            near = [
+                j
+                for dx in (-1, 0, 1)
+                for dy in (-1, 0, 1)
+                for j in cells.get((cx[i] + dx, cy[i] + dy), ())
+                if not taken[j]
             ]
+            near = np.asarray(near)
+            near = near[np.hypot(x[near] - x[i], y[near] - y[i]) <= radius]  # always includes i
+            taken[near] = True
+            weight = count[near]
+            out_x.append(np.dot(x[near], weight) / weight.sum())
+            out_y.append(np.dot(y[near], weight) / weight.sum())
+            out_count.append(weight.sum())
+        return np.asarray(out_x), np.asarray(out_y), np.asarray(out_count, dtype=np.int64)
+
+    def clusters(self, zoom: float, bbox: tuple[float, float, float, float]):
+        """``(lats, lons, counts)`` at ``zoom``; levels over ``MAP_FULL_LEVEL_POINTS``
+        are cut to a Mercator ``(x0, y0, x1, y1)`` box."""
+        level = int(np.clip(np.floor(zoom), MAP_MIN_ZOOM, CLUSTER_MAX_ZOOM + 1))
+        x, y, count = self.levels[level]
+        if len(x) > MAP_FULL_LEVEL_POINTS:
+            x0, y0, x1, y1 = bbox
+            inside = (x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)
+            x, y, count = x[inside], y[inside], count[inside]
+        lats, lons = mercator_latlon(x, y)
+        return lats, lons, count
+
+
+def view_bbox(lat: float, lon: float, zoom: float) -> tuple[float, float, float, float]:
+    """Mercator extent of a ``MAP_VIEWPORT_PX`` view, padded by ``MAP_VIEW_MARGIN``."""
+    x, y = mercator_xy(lat, lon)
+    half_w, half_h = (
+        MAP_VIEW_MARGIN * px / 2 / (MAP_TILE_PX * 2 ** zoom) for px in MAP_VIEWPORT_PX
+    )
+    return float(x - half_w), float(y - half_h), float(x + half_w), float(y + half_h)
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def station_clusters(stations_version: str) -> ClusterIndex:
+    stations_df = load_fire_station_df()
+    return ClusterIndex(stations_df["latitude"], stations_df["longitude"])
+
+
+class _IncidentClusterHolder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_id = -1
+        self.index: ClusterIndex | None = None
+        self.building = False  # a background rebuild is running
+
+    def build(self, rows: List[tuple], last_id: int) -> None:
+        lats = np.array([row[-2] for row in rows], dtype=float)
+        lons = np.array([row[-1] for row in rows], dtype=float)
+        located = np.isfinite(lats) & np.isfinite(lons)
+        index = ClusterIndex(lats[located], lons[located])
+        with self.lock:
+            if last_id > self.last_id:
+                self.index, self.last_id = index, last_id
+            self.building = False
+
+
+@st.cache_resource(show_spinner=False)
+def _incident_cluster_holder() -> _IncidentClusterHolder:
+    return _IncidentClusterHolder()
+
+
+def incident_clusters() -> tuple[int, ClusterIndex]:
+    """``(last incident id, index)`` over logged incidents that carry a position.
+
+    Only the first index is built on the request path; after that new
+    incidents trigger a rebuild on a background thread and the previous
+    index keeps serving until it is done.
+    """
+    cache = incident_log_cache()
+    cache.refresh()
+    rows = list(cache.rows)
+    last_id = rows[-1][0] if rows else 0
+    holder = _incident_cluster_holder()
+    with holder.lock:
+        if holder.index is not None:
+            if holder.last_id != last_id and not holder.building:
+                holder.building = True
+                threading.Thread(target=holder.build, args=(rows, last_id), daemon=True).start()
+            return holder.last_id, holder.index
+    holder.build(rows, last_id)  # nothing to serve yet
+    return holder.last_id, holder.index
+
+
+class _SerialisedDeck(pdk.Deck):
+    """Deck whose JSON spec was built (and memoised) ahead of rendering."""
+
+    def __init__(self, spec: str):
+        super().__init__(layers=[])
+        self._spec = spec
+
+    def to_json(self) -> str:
+        return self._spec
+
+
+def _layer_json(layer: pdk.Layer, data: list | None = None) -> str:
+    """Compact JSON for a layer; ``data`` bypasses pydeck's slower serialiser."""
+    spec = json.loads(layer.to_json())
+    if data is not None:
+        spec["data"] = data
+    return json.dumps(spec, separators=(",", ":"))
+
+
+def _point_rows(lats, lons) -> List[list]:
+    """Bare ``[lon, lat]`` rows at map precision, drawn with ``get_position="-"``.
+
+    Positions are the only per‑row attribute the point layers use, so this
+    is about a tenth of the size of the old JSON records.
+    """
+    lons = np.round(np.asarray(lons, dtype=float), MAP_COORD_DECIMALS)
+    lats = np.round(np.asarray(lats, dtype=float), MAP_COORD_DECIMALS)
+    return np.column_stack([lons, lats]).tolist()
+
+
+def _path_coords(path) -> List[list]:
+    """``[lon, lat(, height)]`` vertices at map precision from ``(lat, lon(, height))`` points."""
+    return [[round(p[1], MAP_COORD_DECIMALS), round(p[0], MAP_COORD_DECIMALS), *p[2:]] for p in path]
+
+
+def _cluster_layers_json(
+    layer_id: str,
+    index: ClusterIndex,
+    view: tuple[float, float, float],
+    color: List[int],
+    point_radius_m: float,
+) -> List[str]:
+    """Single points (metre radius) plus labelled cluster bubbles visible in ``view``."""
+    lat, lon, zoom = view
+    lats, lons, counts = index.clusters(zoom, view_bbox(lat, lon, zoom))
+    single = counts == 1
+    layers = [
+        _layer_json(
+            pdk.Layer(
+                "ScatterplotLayer",
+                id=layer_id,
+                get_position="-",
+                get_radius=point_radius_m,
+                get_fill_color=color,
+                pickable=True,
+            ),
+            _point_rows(lats[single], lons[single]),
         )
-        if not ext_data.empty:
-            layers.append(
+    ]
+    if not single.all():
+        bubbles = [
+            {"p": p, "r": round(CLUSTER_BUBBLE_PX + 4 * float(np.sqrt(n)), 1), "t": str(n)}
+            for p, n in zip(_point_rows(lats[~single], lons[~single]), counts[~single].tolist())
+        ]
+        layers.append(
+            _layer_json(
                 pdk.Layer(
                     "ScatterplotLayer",
-                    data=ext_data,
-                    get_position="[lon, lat]",
-                    get_radius=50,
-                    get_fill_color=[0, 255, 0, 200],
-                )
+                    id=f"{layer_id}-clusters",
+                    get_position="p",
+                    get_radius="r",
+                    radius_units="pixels",
+                    get_fill_color=color,
+                    pickable=True,
+                ),
+                bubbles,
             )
-
-        if highlight_evac:
-            layers.append(
+        )
+        layers.append(
+            _layer_json(
                 pdk.Layer(
-                    "PathLayer",
-                    data=[{
-                        "path": [
-                            [lon, lat] for lat, lon in selected_loc.get("evac_path", [])
-                        ],
-                    }],
-                    get_width=4,
-                    get_color=[255, 165, 0],  # orange line
-                )
+                    "TextLayer",
+                    id=f"{layer_id}-counts",
+                    get_position="p",
+                    get_text="t",
+                    get_size=14,
+                    get_color=[255, 255, 255],
+                ),
+                bubbles,
+            )
+        )
+    return layers
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _base_layers_json(stations_version: str, incidents_version: int, view: tuple[float, float, float]) -> List[str]:
+    """Serialised station, incident and campus layers for one view, cached per dataset version.
+
+    Rows carry only rounded positions, and stations and incidents are
+    clustered to the view's zoom and cut to its extent, so the payload
+    stays bounded however large the registry and history grow.
+    """
+    return [
+        *_cluster_layers_json("fire-stations", station_clusters(stations_version), view, [255, 0, 0, 160], 150),
+        *_cluster_layers_json("incidents", incident_clusters()[1], view, [160, 32, 240, 180], 40),
+        _layer_json(
+            pdk.Layer(
+                "ScatterplotLayer",
+                id="campus-locations",
+                get_position="-",
+                get_radius=100,
+                get_fill_color=[0, 128, 255, 160],
+                pickable=True,
+            ),
+            _point_rows(
+                [loc["latitude"] for loc in CAMPUS_LOCATIONS],
+                [loc["longitude"] for loc in CAMPUS_LOCATIONS],
+            ),
+        ),
+    ]
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _deck_json(
+    stations_version: str,
+    incidents_version: int,
+    view: tuple[float, float, float],
+    map_style: str | None,
+    layout_url: str | None,
+    selected_name: str | None,
+    highlight_evac: bool,
+    extinguishers: tuple,
+    evac_path: tuple,
+    route: tuple,
+    stations: tuple = (),
+) -> str:
+    """Deck JSON for one map state; only the selection‑dependent overlays are built here."""
+    overlays = []
+
+    # Georeferenced site layout under everything else
+    underlays = []
+    if layout_url:
+        underlays.append(
+            pdk.Layer(
+                "BitmapLayer",
+                id="site-layout",
+                image=layout_url,
+                bounds=list(SITE_LAYOUT_BOUNDS),
+                opacity=SITE_LAYOUT_OPACITY,
             )
+        )
+
+    # Extinguishers as small green dots
+    if extinguishers:
+        overlays.append(
+            pdk.Layer(
+                "ScatterplotLayer",
+                id="extinguishers",
+                data=_point_rows(*zip(*extinguishers)),
+                get_position="-",
+                get_radius=50,
+                get_fill_color=[0, 255, 0, 200],
+            )
+        )
+
+    # Evac path for selected location
+    if selected_name and highlight_evac:
+        overlays.append(
+            pdk.Layer(
+                "PathLayer",
+                id="evac-path",
+                data=[{"path": _path_coords(evac_path)}],
+                get_width=4,
+                get_color=[255, 165, 0],  # orange line
+            )
+        )
+
+    # Responding stations, drawn even when the clustered layer cuts them off
+    if stations:
+        overlays.append(
+            pdk.Layer(
+                "ScatterplotLayer",
+                id="responding-stations",
+                data=_point_rows(*zip(*stations)),
+                get_position="-",
+                get_radius=150,
+                radius_min_pixels=6,
+                get_fill_color=[255, 0, 0, 220],
+                get_line_color=[255, 255, 255],
+                line_width_min_pixels=2,
+                stroked=True,
+                pickable=True,
+            )
+        )
+
+    # Fire‑truck route from the responding station
+    if route:
+        overlays.append(
+            pdk.Layer(
+                "PathLayer",
+                id="truck-route",
+                data=[{"path": _path_coords(route)}],
+                get_width=6,
+                width_min_pixels=3,
+                get_color=[200, 30, 0],
+            )
+        )
 
     view_state = pdk.ViewState(
-        latitude=IRIDM_LAT,
-        longitude=IRIDM_LON,
-        zoom=16,
+        latitude=view[0],
+        longitude=view[1],
+        zoom=view[2],
+        min_zoom=MAP_MIN_ZOOM,
+        max_zoom=MAP_MAX_ZOOM,
         pitch=45,
     )
+    if map_style:
+        deck = pdk.Deck(layers=[], initial_view_state=view_state, map_style=map_style, map_provider="carto")
+    else:
+        deck = pdk.Deck(layers=[], initial_view_state=view_state)
+    # Splice the cached base layer JSON in as text rather than re‑serialising it
+    spec = json.loads(deck.to_json())
+    spec["layers"] = "@@LAYERS@@"
+    layers = [
+        *(_layer_json(layer) for layer in underlays),
+        *_base_layers_json(stations_version, incidents_version, view),
+        *(_layer_json(layer) for layer in overlays),
+    ]
+    return json.dumps(spec, separators=(",", ":")).replace('"@@LAYERS@@"', "[" + ",".join(layers) + "]")
+
 
-    st.pydeck_chart(pdk.Deck(layers=layers, initial_view_state=view_state))
+def draw_map(
+    selected_loc: dict | None,
+    highlight_evac: bool = False,
+    route: List[tuple[float, float]] | None = None,
+    extinguishers: pd.DataFrame | None = None,
+    evac_path: List[tuple] | None = None,
+    stations: pd.DataFrame | None = None,
+):
+    """Render a pydeck map with campus, fire stations, and optional overlays.
+
+    ``evac_path`` overrides the building's route; ``(lat, lon, height_m)``
+    points draw the indoor leg in 3‑D. ``stations`` (the ranked responders)
+    are always drawn, whatever the view's extent.
+    """
+    # Extinguishers: nearest from any building if given, else the building's own
+    if extinguishers is not None:
+        ext_points = tuple(zip(extinguishers["latitude"], extinguishers["longitude"]))
+    else:
+        ext_points = tuple((selected_loc or {}).get("extinguishers", []))
+
+    if selected_loc and highlight_evac and evac_path is None:
+        # Computed route to the nearest assembly point; hand‑drawn path as fallback
+        evac = evacuation_router().route_for_location(selected_loc)
+        evac_path = evac["path"] if evac else selected_loc.get("evac_path", [])
+
+    # Level of detail: stations and incidents are clustered for this zoom and extent
+    zoom = st.slider(
+        "Map zoom",
+        MAP_MIN_ZOOM,
+        MAP_MAX_ZOOM,
+        MAP_DEFAULT_ZOOM,
+        key="map_zoom",
+        help="Sets the clustering level of stations and incidents; the map itself pans and zooms freely.",
+    )
+    centre = (selected_loc["latitude"], selected_loc["longitude"]) if selected_loc else (IRIDM_LAT, IRIDM_LON)
+    # Offline base map (if an MBTiles file is installed) and layout overlay, served locally
+    store, layout = tile_store(), layout_variants()
+    map_style = layout_url = None
+    # Keep the online defaults unless this browser can actually reach the server
+    base_url = local_map_url(store, layout)
+    if base_url:
+        if store:
+            map_style = f"{base_url}/style.json"
+        if layout:
+            # Fetch only the variant that matches the layout's on‑screen width at this zoom
+            west, _, east, _ = SITE_LAYOUT_BOUNDS
+            x_west, _ = mercator_xy(IRIDM_LAT, west)
+            x_east, _ = mercator_xy(IRIDM_LAT, east)
+            layout_url = f"{base_url}/layout/{layout.pick((x_east - x_west) * MAP_TILE_PX * 2 ** zoom)}"
+
+    spec = _deck_json(
+        station_registry().version,
+        incident_clusters()[0],
+        (*centre, zoom),
+        map_style,
+        layout_url,
+        selected_loc["name"] if selected_loc else None,
+        highlight_evac,
+        ext_points,
+        tuple(map(tuple, evac_path or [])),
+        tuple(map(tuple, route or [])),
+        tuple(zip(stations["latitude"], stations["longitude"])) if stations is not None else (),
+    )
+    st.pydeck_chart(_SerialisedDeck(spec))
 
 ###############################################################################
 # ------------------------------  UI  --------------------------------------- #
 ###############################################################################
 
+def incident_log_view() -> None:
+    """Filtered, paginated incident log; only the visible page is fetched.
+
+    Pages are addressed by the key of the row before them rather than a
+    page number, so neither a row count nor an OFFSET scan is needed.
+    """
+    store = incident_store()
+    col_dates, col_status, col_loc, col_size = st.columns((2, 1, 1, 1))
+    dates = col_dates.date_input("Date range", value=(), key="log_dates")
+    status = col_status.selectbox("Status", store.distinct("status"), index=None, key="log_status")
+    location = col_loc.selectbox("Location", store.distinct("location"), index=None, key="log_loc")
+    page_size = col_size.selectbox("Rows per page", INCIDENT_PAGE_SIZES, key="log_page_size")
+
+    start = dates[0].isoformat() if len(dates) > 0 else None
+    # ``end`` is exclusive, so include the whole last selected day
+    end = (dates[-1] + timedelta(days=1)).isoformat() if len(dates) > 0 else None
+    filters = (start, end, status, location, page_size)
+    if st.session_state.get("log_filters") != filters:
+        st.session_state.log_filters = filters
+        st.session_state.log_pages = [None]  # ``before`` key of every page visited so far
+    pages = st.session_state.log_pages
+    # One extra row tells whether an older page exists
+    page_df = store.query(start, end, status, location, limit=page_size + 1, before=pages[-1])
+    has_older = len(page_df) > page_size
+    page_df = page_df.head(page_size)
+    if page_df.empty:
+        st.info("No incidents match these filters.")
+        return
+
+    first = (len(pages) - 1) * page_size
+    st.caption(f"Showing {first + 1}–{first + len(page_df)}")
+    st.dataframe(page_df, use_container_width=True, hide_index=True)
+    col_newer, col_older = st.columns(2)
+    if col_newer.button("← Newer", disabled=len(pages) == 1, key="log_newer"):
+        pages.pop()
+        st.rerun()
+    if col_older.button("Older →", disabled=not has_older, key="log_older"):
+        last = page_df.iloc[-1]
+        pages.append((last["timestamp"], int(last["id"])))
+        st.rerun()
+
+
+def evacuation_capacity_view() -> None:
+    """Clearance time and bottlenecks per building for an occupancy scenario."""
+    st.subheader("🚪 Evacuation capacity analysis")
+    st.caption(
+        "Time‑expanded max‑flow over corridor and exit‑door throughput. "
+        "Set the headcount per building to plan a drill."
+    )
+    blocked = tuple(sorted(evacuation_router().blocked))
+    rows = []
+    cols = st.columns(len(CAMPUS_LOCATIONS))
+    for col, loc in zip(cols, CAMPUS_LOCATIONS):
+        occupancy = col.number_input(
+            f"{loc['name']} occupancy", 0, 10_000, loc.get("occupancy", 0), step=10
+        )
+        result = evacuation_capacity(loc["name"], int(occupancy), blocked)
+        clearance = result["clearance_s"]
+        rows.append(
+            {
+                "location": loc["name"],
+                "occupancy": occupancy,
+                "clearance_min": None if clearance is None else round(clearance / 60, 1),
+                "bottlenecks": ", ".join(result["bottlenecks"][:3]) or "–",
+            }
+        )
+    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+
+def evacuation_drill_view() -> None:
+    """Monte Carlo drill simulation with clearance‑time distributions."""
+    st.subheader("🏃 Evacuation drill simulator")
+    col_loc, col_occ, col_runs = st.columns(3)
+    loc = col_loc.selectbox(
+        "Building", CAMPUS_LOCATIONS, format_func=lambda loc: loc["name"], key="drill_loc"
+    )
+    occupancy = col_occ.number_input(
+        "Occupancy", 1, 10_000, loc.get("occupancy", 50), step=10, key="drill_occ"
+    )
+    runs = col_runs.slider("Monte Carlo runs", 10, 500, 100, step=10, key="drill_runs")
+    if not st.button("▶️ Run drill simulation"):
+        return
+    blocked = tuple(sorted(evacuation_router().blocked))
+    with st.spinner("Simulating…"):
+        times = drill_clearance_times(loc["name"], int(occupancy), runs, blocked)
+    if not len(times):
+        st.error("No open evacuation route from this building.")
+        return
+    cleared = np.isfinite(times)
+    horizon_min = EVAC_MAX_HORIZON_S // 60
+    if not cleared.any():
+        st.error(f"Building not cleared within {horizon_min} min in any of the {len(times)} runs.")
+        return
+    if not cleared.all():
+        st.warning(f"{(~cleared).sum()} of {len(times)} runs not cleared within {horizon_min} min.")
+    minutes = times[cleared] / 60
+    p50, p90 = np.percentile(minutes, [50, 90])
+    st.markdown(
+        f"Clearance time – median **{p50:.1f} min**, 90th percentile **{p90:.1f} min**, "
+        f"worst **{minutes.max():.1f} min** over {len(times)} runs"
+    )
+    counts, edges = np.histogram(minutes, bins=20)
+    st.bar_chart(
+        pd.DataFrame({"runs": counts}, index=[f"{edge:.1f}" for edge in edges[:-1]]),
+        x_label="clearance time (min)",
+    )
+
+
 def main():
     st.set_page_config(
         page_title="IRIDM DM Assistant",
@@ -203,7 +3171,15 @@ def main():
         page_icon="🚒",
     )
 
-    load_existing_log()
+    registry = station_registry()
+    if registry.dropped_rows:
+        st.warning(
+            f"Ignored {registry.dropped_rows} row(s) in {FIRE_STATIONS_CSV} with a missing "
+            "name or invalid coordinates."
+        )
+    # Start the background builds (POI × station ETAs, lookup grid) as soon as the data is loaded
+    eta_matrix()
+    station_grid()
 
     st.title("IRIDM Disaster‑Management Assistant :fire:")
 
@@ -212,8 +3188,14 @@ def main():
 
     with col_img:
         st.header("Campus layout (schematic)")
-        if SITE_LAYOUT_PATH.exists():
-            st.image(SITE_LAYOUT_PATH, use_column_width=True)
+        layout = layout_variants()
+        if layout and local_map_url(tile_store(), layout):
+            # A small preview only; the full schematic is overlaid on the map
+            st.image(layout.data[layout.pick(0)], width="stretch")
+            st.caption("Overlaid on the map at its surveyed position; zoom in for detail.")
+        elif layout:
+            # The map cannot fetch the overlay from this browser, so show the schematic in full
+            st.image(layout.data[layout.largest], width="stretch")
         else:
             st.warning("Site layout image not found – place 'iridm_site_layout..png' next to the app.")
 
@@ -246,7 +3228,7 @@ def main():
                 index=None,
                 placeholder="Choose…",
             )
-        elif (disaster_type == "Man-made"):
+        elif (disaster_type == "Man‑made"):
             subtype = st.sidebar.selectbox(
                 "Specify Type of Incident",
                 ["Fire", "Train Accident", "Infrastructure Collapse", "Machinery BreakDown", "Medical Emergency","Other"],
@@ -263,30 +3245,113 @@ def main():
         if subtype == "Fire":
             st.sidebar.subheader("Fire Incident Details")
 
-            location_names = [loc["name"] for loc in CAMPUS_LOCATIONS]
-            selected_loc_name = st.sidebar.selectbox("Where is the fire?", location_names, index=None)
+            tree = location_tree()
+            query = st.sidebar.text_input("🔎 Search rooms, buildings or fire stations")
+            picked = None  # floor / room node chosen through search
+            if query:
+                hits = place_search().search(query, PLACE_SEARCH_RESULTS)
+                place_hits = [hit for hit in hits if hit["kind"] != "station"]
+                station_hits = [hit for hit in hits if hit["kind"] == "station"]
+                picked = st.sidebar.selectbox(
+                    "Where is the fire?",
+                    [hit["key"] for hit in place_hits],
+                    index=0 if place_hits else None,
+                    format_func=lambda key: next(h["label"] for h in place_hits if h["key"] == key),
+                )
+                selected_loc_name = tree.location_of(picked)["name"] if picked else None
+                if station_hits:
+                    stations_df = load_fire_station_df()
+                    st.sidebar.markdown(
+                        "**Matching fire stations**  \n"
+                        + "  \n".join(
+                            f"🚒 {hit['label']} – 📞 {stations_df.at[hit['key'], 'phone']}"
+                            for hit in station_hits
+                        )
+                    )
+                if not hits:
+                    st.sidebar.caption("No matches.")
+            else:
+                selected_loc_name = st.sidebar.selectbox("Where is the fire?", tree.building_names, index=None)
             gps_option = st.sidebar.checkbox("Use my GPS location instead", value=False)
 
-            selected_loc = next(
-                (loc for loc in CAMPUS_LOCATIONS if loc["name"] == selected_loc_name), None
-            )
+            selected_loc = tree.locations.get(selected_loc_name)
+            gps_floor = None
+
+            # Off‑campus incidents: resolve a typed landmark / address offline
+            address = None
+            if selected_loc is None and not gps_option:
+                address_query = st.sidebar.text_input("…or type a landmark / address off campus")
+                if address_query:
+                    places = gazetteer().autocomplete(address_query)
+                    address = st.sidebar.selectbox(
+                        "Matching places",
+                        places,
+                        index=0 if places else None,
+                        format_func=lambda p: f"{p['name']} ({Gazetteer.KIND_LABELS.get(p['kind'], p['kind'])})",
+                    )
+                    if not places:
+                        st.sidebar.caption("No matching place in the offline gazetteer.")
 
-            if selected_loc_name is None and not gps_option:
-                st.sidebar.info("Select a campus location or use GPS to proceed.")
+            if selected_loc_name is None and not gps_option and address is None:
+                st.sidebar.info("Select a campus location, type a landmark or use GPS to proceed.")
             else:
                 # Compute distances/ETA to nearest fire station
                 if gps_option:
-                    # Use browser geolocation via st_javascript (needs external component) – placeholder
-                    st.warning("GPS capture not implemented in this prototype. Using location centre.")
-                    user_lat, user_lon = IRIDM_LAT, IRIDM_LON
+                    # Browser geolocation needs an external component; take the fix as typed coordinates
+                    user_lat = st.sidebar.number_input("GPS latitude", value=IRIDM_LAT, format="%.6f")
+                    user_lon = st.sidebar.number_input("GPS longitude", value=IRIDM_LON, format="%.6f")
+                    altitude = st.sidebar.number_input("GPS altitude (m, optional)", value=None)
+                    building, gps_floor = building_locator().locate(user_lat, user_lon, altitude)
+                    if building:
+                        selected_loc, selected_loc_name = building, building["name"]
+                        where = f"**{building['name']}**" + (f", floor {gps_floor}" if gps_floor is not None else "")
+                        st.sidebar.success(f"📍 You are inside {where}")
+                    else:
+                        st.sidebar.info("📍 GPS fix is outside the mapped building footprints.")
+                elif address is not None:
+                    user_lat, user_lon = address["latitude"], address["longitude"]
+                    selected_loc_name = address["name"]
                 else:
                     user_lat, user_lon = selected_loc["latitude"], selected_loc["longitude"]
 
-                stations_df = load_fire_station_df()
-                nearest = nearest_fire_station(user_lat, user_lon, stations_df)
+                # Narrow down to a floor and room where the building has an indoor model
+                incident_id = tree.building_ids[selected_loc_name] if selected_loc else None
+                floors = tree.children(incident_id) if incident_id else []
+                if floors:
+                    levels = [f["level"] for f in floors]
+                    floor_level = gps_floor
+                    if picked and not gps_option and tree.nodes[picked]["kind"] != "building":
+                        floor_level = tree.nodes[picked]["level"]
+                    floor_node = st.sidebar.selectbox(
+                        "Floor",
+                        floors,
+                        index=levels.index(floor_level) if floor_level in levels else 0,
+                        format_func=lambda node: node["name"],
+                    )
+                    rooms = tree.children(floor_node["id"])
+                    room_ids = [room["id"] for room in rooms]
+                    room_node = st.sidebar.selectbox(
+                        "Room",
+                        rooms,
+                        index=room_ids.index(picked) if picked in room_ids and not gps_option else None,
+                        placeholder="Whole floor",
+                        format_func=lambda node: node["name"],
+                    )
+                    incident_id = (room_node or floor_node)["id"]
+                    if room_node and not gps_option:
+                        user_lat, user_lon = room_node["latitude"], room_node["longitude"]
+
+                # The ETA matrix is keyed by building; a GPS fix, address or room elsewhere needs a live query
+                at_poi = selected_loc is not None and (user_lat, user_lon) == (
+                    selected_loc["latitude"], selected_loc["longitude"]
+                )
+                ranked = ranked_response_stations(
+                    user_lat, user_lon, poi_name=selected_loc_name if at_poi else None
+                )
+                nearest = ranked.iloc[0]
 
-                distance_km = nearest["distance_km"]
-                eta_min = int((distance_km / AVG_FIRE_TRUCK_SPEED_KMPH) * 60)
+                distance_km = nearest["road_km"]
+                eta_min = nearest["eta_min"]
 
                 st.sidebar.markdown("---")
                 st.sidebar.markdown(
@@ -294,16 +3359,82 @@ def main():
                     f"📞 [Call](`tel:{nearest['phone']}`)  \n"
                     f"🛣️ {distance_km} km &nbsp;&nbsp; ⏱️ ≈ {eta_min} min"
                 )
+                if len(ranked) > 1:
+                    st.sidebar.markdown(
+                        "**Backup stations**  \n"
+                        + "  \n".join(
+                            f"{rank}. {row['name']} – {row['road_km']} km, ≈ {row['eta_min']} min"
+                            for rank, (_, row) in enumerate(ranked.iloc[1:].iterrows(), start=2)
+                        )
+                    )
+                with st.sidebar.expander(f"All fire stations within {MUTUAL_AID_RADIUS_KM} km"):
+                    nearby = fire_stations_within(user_lat, user_lon, MUTUAL_AID_RADIUS_KM, load_fire_station_df())
+                    st.markdown(
+                        "  \n".join(
+                            f"🚒 {row.name} – {row.distance_km} km – 📞 {row.phone}" for row in nearby.itertuples()
+                        )
+                        or "None in range."
+                    )
 
                 # Action buttons
                 if st.sidebar.button("📞 Dial Fire Station & Log Call"):
-                    log_event(status="CALL_PLACED", location=selected_loc_name or "GPS")
+                    log_event(
+                        status="CALL_PLACED",
+                        location=selected_loc_name or "GPS",
+                        latitude=user_lat,
+                        longitude=user_lon,
+                    )
                     st.sidebar.success("Call logged – stay safe! 🚒")
 
                 if st.sidebar.button("✅ Firefighters Arrived – Mark Resolved"):
-                    log_event(status="RESOLVED", location=selected_loc_name or "GPS")
+                    log_event(
+                        status="RESOLVED",
+                        location=selected_loc_name or "GPS",
+                        latitude=user_lat,
+                        longitude=user_lon,
+                    )
                     st.sidebar.success("Incident marked as resolved. Report saved.")
 
+                router = evacuation_router()
+                evac = indoor_evacuation_route(incident_id, router) if incident_id else None
+                if evac or router.blocked:
+                    # Offer the corridors on the current route; blocking one re‑routes
+                    route_nodes = router.route_from_node(evac["exit"]) if evac else []
+                    corridors = {
+                        router.edge_key(a, b) for a, b in zip(route_nodes, route_nodes[1:])
+                    } | router.blocked
+                    blocked = st.sidebar.multiselect(
+                        "Blocked corridors",
+                        sorted(corridors),
+                        default=sorted(router.blocked),
+                        format_func=lambda edge: " ↔ ".join(n.replace("_", " ") for n in edge),
+                    )
+                    if set(blocked) != router.blocked:
+                        for edge in set(blocked) - router.blocked:
+                            router.block_edge(*edge)
+                        for edge in router.blocked - set(blocked):
+                            router.unblock_edge(*edge)
+                        st.rerun()  # redraw the corridor list for the repaired route
+                if evac:
+                    st.sidebar.markdown(
+                        f"🚶 Evacuate via **{evac['exit'].replace('_', ' ')}** to the "
+                        f"**{evac['assembly']}** (≈ {max(1, round(evac['seconds'] / 60))} min walk)"
+                    )
+                elif router.blocked and selected_loc and selected_loc.get("exits"):
+                    st.sidebar.error("No open evacuation route from this location – shelter in place.")
+
+                # Campus extinguishers are no help off campus
+                extinguishers = nearest_extinguishers(user_lat, user_lon) if address is None else None
+                if extinguishers is not None and not extinguishers.empty:
+                    st.sidebar.markdown(
+                        "**Nearest extinguishers**  \n"
+                        + "  \n".join(
+                            f"🧯 {row.building} – "
+                            + (f"{row.walk_m} m walk" if row.walk_m is not None else f"{row.straight_m} m away")
+                            for row in extinguishers.itertuples()
+                        )
+                    )
+
                 # Upload photos of incident
                 st.sidebar.file_uploader(
                     "Upload photo/video evidence (optional)",
@@ -324,7 +3455,14 @@ def main():
 
                 # Draw map with highlight
                 with col_map:
-                    draw_map(selected_loc, highlight_evac=True)
+                    draw_map(
+                        selected_loc,
+                        highlight_evac=True,
+                        route=nearest["route"],
+                        extinguishers=extinguishers,
+                        evac_path=evac["path"] if evac else None,
+                        stations=ranked,
+                    )
 
         else:
             # Incidents that are not Fire have no custom flow yet
@@ -335,14 +3473,26 @@ def main():
         with col_map:
             draw_map(selected_loc=None)
 
+    if "Evacuation Plans" in (disaster_prep, disaster_mitig):
+        evacuation_capacity_view()
+    if "Drills" in (disaster_prep, disaster_mitig):
+        evacuation_drill_view()
+
     # ---- Incident log table ----
-    st.subheader("📜 Incident Log (session + persisted)")
-    log_df = pd.DataFrame(st.session_state.get("log", []))
-    if log_df.empty:
-        st.info("No incidents logged this session.")
+    st.subheader("📜 Incident Log (all operators)")
+    feed_df = incident_log_cache().recent(INCIDENT_FEED_SIZE)
+    if feed_df.empty:
+        st.info("No incidents logged yet.")
     else:
-        st.dataframe(log_df.sort_values("timestamp", ascending=False), use_container_width=True)
+        st.markdown("**Latest activity**")
+        st.dataframe(feed_df, use_container_width=True, hide_index=True)
+        incident_log_view()
 
 
 if __name__ == "__main__":
-    main()
+    if "--check-distances" in sys.argv[1:]:
+        # Accuracy/speed report for the distance backends; no UI
+        print(check_distance_backends().to_string(index=False))
+        print(benchmark_distance_backends().to_string(index=False))
+    else:
+        main()
@@ -0,0 +1,36 @@
+"""Differential test of the fast distance backends against the exact geodesic."""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import iridm_dm_app as app  # noqa: E402
+
+
+@pytest.fixture(scope="module", params=list(app.DISTANCE_CHECK_SCALES.items()), ids=lambda item: item[0])
+def pairs_and_geodesic(request):
+    _, max_km = request.param
+    pairs = app._random_pairs(2000, max_km, np.random.default_rng(0))
+    return max_km, pairs, app.geodesic_km(*pairs)
+
+
+def test_equirectangular_within_metres(pairs_and_geodesic):
+    max_km, pairs, exact = pairs_and_geodesic
+    err_m = np.abs(app.equirectangular_km(*pairs) - exact) * 1000
+    assert err_m.max() <= app.EQUIRECTANGULAR_MAX_ERR_M[max_km]
+
+
+def test_haversine_within_relative_bound(pairs_and_geodesic):
+    _, pairs, exact = pairs_and_geodesic
+    err_km = np.abs(app.haversine_km(*pairs) - exact)
+    assert (err_km <= app.HAVERSINE_MAX_REL_ERR * exact + 1e-6).all()
+
+
+def test_distance_km_dispatches_to_backend():
+    pairs = app._random_pairs(50, 30.0, np.random.default_rng(1))
+    for name, backend in app.DISTANCE_BACKENDS.items():
+        np.testing.assert_array_equal(app.distance_km(*pairs, backend=name), backend(*pairs))
@@ -0,0 +1,49 @@
+"""Max-flow and clearance-time scenarios with known answers."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import iridm_dm_app as app  # noqa: E402
+
+HOSTEL_CORRIDORS = (("central_walk", "hostel_exit"), ("hostel_exit", "sports_ground_assembly"))
+
+
+def test_max_flow_textbook_network():
+    # CLRS figure 26.1: maximum flow 23
+    net = app.FlowNetwork(6)
+    for u, v, capacity in [
+        (0, 1, 16), (0, 2, 13), (1, 3, 12), (2, 1, 4), (2, 4, 14),
+        (3, 2, 9), (3, 5, 20), (4, 3, 7), (4, 5, 4),
+    ]:
+        net.add_edge(u, v, capacity)
+    assert net.max_flow(0, 5) == pytest.approx(23)
+
+
+def test_hostel_clearance_is_limited_by_its_exit_door():
+    result = app.evacuation_capacity("Hostel", 300)
+    # 300 people through one 45/min door take 400 s, plus the walk to the sports ground
+    door_s = 300 / app.EXIT_CAPACITY_PPM * 60
+    assert door_s <= result["clearance_s"] <= door_s + 60
+    assert result["clearance_s"] == 450
+    assert result["bottlenecks"][0] == "exit door hostel exit"
+
+
+def test_two_exit_doors_share_the_load():
+    one_door = app.evacuation_capacity("Hostel", 300)["clearance_s"]
+    two_doors = app.evacuation_capacity("Admin Block", 300)
+    assert 300 / (2 * app.EXIT_CAPACITY_PPM) * 60 <= two_doors["clearance_s"] < one_door
+    assert set(two_doors["bottlenecks"][:2]) == {"exit door admin north exit", "exit door admin south exit"}
+
+
+def test_no_clearance_when_every_route_is_blocked():
+    result = app.evacuation_capacity("Hostel", 300, tuple(sorted(HOSTEL_CORRIDORS)))
+    assert result["clearance_s"] is None
+    assert result["bottlenecks"] == []
+
+
+def test_empty_building_clears_immediately():
+    assert app.evacuation_capacity("Hostel", 0)["clearance_s"] == 0
@@ -0,0 +1,62 @@
+"""Incremental corridor blocking/unblocking against routers rebuilt from scratch."""
+
+import random
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import iridm_dm_app as app  # noqa: E402
+
+
+def _random_campus(rng: random.Random):
+    n = rng.randint(4, 25)
+    nodes = {f"n{i}": (12.90 + rng.random() * 0.01, 77.43 + rng.random() * 0.01) for i in range(n)}
+    names = list(nodes)
+    edges = {app.EvacuationRouter.edge_key(names[i], names[rng.randrange(i)]) for i in range(1, n)}
+    for _ in range(rng.randint(0, 2 * n)):
+        a, b = rng.sample(names, 2)
+        edges.add(app.EvacuationRouter.edge_key(a, b))
+    assembly = {name: f"Assembly {name}" for name in rng.sample(names, rng.randint(1, 3))}
+    return nodes, sorted(edges), assembly
+
+
+def _assert_consistent(router: app.EvacuationRouter, nodes, edges, assembly) -> None:
+    fresh = app.EvacuationRouter(nodes, [e for e in edges if e not in router.blocked], assembly)
+    for node in nodes:
+        assert router.seconds[node] == pytest.approx(fresh.seconds[node], abs=1e-9)
+        hop = router.next_hop[node]
+        if hop is None:
+            assert node in assembly or not np.isfinite(router.seconds[node])
+            continue
+        # Ties may pick a different next hop; it must still be an open, shortest step
+        assert app.EvacuationRouter.edge_key(node, hop) not in router.blocked
+        step = router.weights[app.EvacuationRouter.edge_key(node, hop)]
+        assert router.seconds[node] == pytest.approx(router.seconds[hop] + step, abs=1e-9)
+        assert node in router.children[hop]
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_incremental_repair_matches_rebuild(seed):
+    rng = random.Random(seed)
+    nodes, edges, assembly = _random_campus(rng)
+    router = app.EvacuationRouter(nodes, edges, assembly)
+    for _ in range(12):
+        edge = rng.choice(edges)
+        if edge in router.blocked and rng.random() < 0.6:
+            router.unblock_edge(*edge)
+        else:
+            router.block_edge(*edge)
+        _assert_consistent(router, nodes, edges, assembly)
+
+
+def test_route_for_location_ends_at_an_assembly_point():
+    router = app.EvacuationRouter(app.CAMPUS_PATH_NODES, app.CAMPUS_PATH_EDGES, app.CAMPUS_ASSEMBLY_POINTS)
+    for loc in app.CAMPUS_LOCATIONS:
+        route = router.route_for_location(loc)
+        assert route is not None
+        assert route["assembly"] in app.CAMPUS_ASSEMBLY_POINTS.values()
+        assert route["exit"] in loc["exits"]
@@ -0,0 +1,91 @@
+"""Brute-force check of the nearest-station lookup grid, before and after an incremental patch."""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import iridm_dm_app as app  # noqa: E402
+
+K = 3
+
+
+def _registry(df: pd.DataFrame, version: str) -> SimpleNamespace:
+    index = app.SphericalKDTree(df["latitude"], df["longitude"])
+    return SimpleNamespace(df=df, index=index, version=version)
+
+
+def _brute_force(registry: SimpleNamespace, lat: float, lon: float, k: int) -> np.ndarray:
+    chord = np.linalg.norm(registry.index.xyz - app.unit_vectors(lat, lon)[0], axis=1)
+    return np.argsort(chord, kind="stable")[:k]
+
+
+def _assert_exact(grid: app.StationGrid, registry: SimpleNamespace, queries: np.ndarray) -> None:
+    for lat, lon in queries:
+        for k in (1, K):
+            found = grid.lookup(lat, lon, k)
+            assert found is not None, (lat, lon)
+            np.testing.assert_array_equal(found, _brute_force(registry, lat, lon, k))
+
+
+@pytest.fixture(scope="module")
+def stations() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    n = 3000
+    return pd.DataFrame({
+        "name": [f"Station {i}" for i in range(n)],
+        "latitude": rng.uniform(8, 35, n),
+        "longitude": rng.uniform(68, 97, n),
+    })
+
+
+@pytest.fixture(scope="module")
+def queries() -> np.ndarray:
+    rng = np.random.default_rng(1)
+    return np.column_stack((rng.uniform(7.6, 35.4, 3000), rng.uniform(67.6, 97.4, 3000)))
+
+
+@pytest.fixture(scope="module")
+def grid(stations) -> app.StationGrid:
+    return app.StationGrid(_registry(stations, "v1"), K, 0.05, 0.5, 50_000)
+
+
+def test_lookup_matches_brute_force(grid, queries):
+    _assert_exact(grid, grid.registry, queries)
+
+
+def test_lookup_outside_grid_or_too_deep_returns_none(grid):
+    assert grid.lookup(60.0, 80.0) is None
+    assert grid.lookup(20.0, 80.0, K + 1) is None
+
+
+def test_incremental_patch_matches_brute_force(grid, stations, queries):
+    rng = np.random.default_rng(2)
+    changed = stations.copy()
+    moved = rng.choice(len(changed), 30, replace=False)
+    changed.loc[moved, "latitude"] = np.clip(changed.loc[moved, "latitude"] + rng.normal(0, 0.5, 30), 8, 35)
+    changed = changed.drop(index=rng.choice(np.setdiff1d(np.arange(len(changed)), moved), 30, replace=False))
+    added = pd.DataFrame({
+        "name": [f"New station {i}" for i in range(30)],
+        "latitude": rng.uniform(8, 35, 30),
+        "longitude": rng.uniform(68, 97, 30),
+    })
+    registry = _registry(pd.concat([changed, added], ignore_index=True), "v2")
+
+    patched = grid.updated(registry)
+    assert patched is not None
+    _assert_exact(patched, registry, queries)
+    # Queries right next to the new stations exercise the cells they joined
+    _assert_exact(patched, registry, added[["latitude", "longitude"]].to_numpy() + 0.001)
+    # The original grid is untouched
+    _assert_exact(grid, grid.registry, queries[:300])
+
+
+def test_large_change_asks_for_a_rebuild(grid, stations):
+    moved = stations.assign(latitude=np.clip(stations["latitude"] + 0.1, 8, 35))
+    assert grid.updated(_registry(moved, "v3")) is None